@@ -1,80 +1,758 @@
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import FastAPI, HTTPException, Depends, Security, Request, Query
 from fastapi.security.api_key import APIKeyHeader
+from fastapi.responses import Response, StreamingResponse
+import numpy as np
 import pandas as pd
+import orjson
+import pyarrow as pa
+import io
 import os
 import json
+import base64
+import gzip
+import hashlib
+import math
+import asyncio
+import collections
+import contextlib
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from utils.api_usage import add_usage
+from utils.dataset_store import DATA_FILE, get_sheet, get_sheet_table, get_data_version, get_data_modified, get_lookup, get_loaded_version, get_datasets
+from utils.lookup import lookup_positions
+from utils.periods import PERIOD_COLUMNS, slice_period
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only gzip is offered
+    brotli = None
 
 # --- CONFIGURATION ---
-app = FastAPI(title="OTEP Data API", version="1.1.0")
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    # Counters recorded since the last periodic write
+    if _USAGE:
+        flush_usage()
+
+app = FastAPI(title="OTEP Data API", version="1.1.0", lifespan=lifespan)
 
 API_KEY_NAME = "X-API-KEY"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
-DATA_FILE = os.path.join("data", "otep_data_saved.xlsx")
 KEYS_FILE = "api_keys.json" # Shared key file
 
 # --- SECURITY HELPER ---
+# Active keys are kept in memory (key -> settings) and KEYS_FILE is only re-read when its
+# mtime / size / inode change. views/api_management.py replaces the file atomically,
+# so a generated or revoked key is picked up within KEYS_CHECK_INTERVAL seconds.
+KEYS_CHECK_INTERVAL = 1.0
+_KEYS = {"stamp": None, "keys": {}, "checked": None}
+_KEYS_LOCK = threading.Lock()
+
+def _keys_stamp():
+    try:
+        stat = os.stat(KEYS_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
 def get_valid_keys():
-    """Loads active keys from the JSON file."""
-    if not os.path.exists(KEYS_FILE):
-        return []
+    """Returns {key: settings} for the active keys, reloading the JSON file only when it changed."""
+    now = time.monotonic()
+    checked = _KEYS["checked"]
+    if checked is not None and now - checked < KEYS_CHECK_INTERVAL:
+        return _KEYS["keys"]
+
+    with _KEYS_LOCK:
+        stamp = _keys_stamp()
+        if stamp is None:
+            _KEYS["stamp"], _KEYS["keys"] = None, {}
+        elif stamp != _KEYS["stamp"]:
+            try:
+                with open(KEYS_FILE, "r") as f:
+                    data = json.load(f)
+                _KEYS["stamp"], _KEYS["keys"] = stamp, {k: v if isinstance(v, dict) else {} for k, v in data.items()}
+            except Exception as e:
+                # Keep the previous keys and try again on the next check
+                print(f"Error loading {KEYS_FILE}: {e}")
+        _KEYS["checked"] = now
+    return _KEYS["keys"]
+
+# --- RATE LIMITING ---
+# Token bucket per key: "rate_limit" requests/second refill up to "burst" requests.
+# Both can be set per key in KEYS_FILE; keys without them get the defaults below.
+DEFAULT_RATE_LIMIT = 5.0
+DEFAULT_BURST = 20
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+def take_token(api_key, settings):
+    """Returns 0 if the request may go ahead, else the seconds until a token is available."""
     try:
-        with open(KEYS_FILE, "r") as f:
-            data = json.load(f)
-            return list(data.keys())
-    except:
-        return []
-
-async def get_api_key(api_key_header: str = Security(api_key_header)):
-    """Validates if the provided key exists in our database."""
+        rate = float(settings.get("rate_limit", DEFAULT_RATE_LIMIT))
+        burst = float(settings.get("burst", DEFAULT_BURST))
+    except (TypeError, ValueError):
+        rate, burst = DEFAULT_RATE_LIMIT, DEFAULT_BURST
+    if rate <= 0:
+        # 0 / negative = unlimited
+        return 0
+
+    now = time.monotonic()
+    with _BUCKETS_LOCK:
+        tokens, last = _BUCKETS.get(api_key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            _BUCKETS[api_key] = (tokens, now)
+            return (1 - tokens) / rate
+        _BUCKETS[api_key] = (tokens - 1, now)
+        return 0
+
+# --- USAGE COUNTERS ---
+# Requests / bytes / throttled per key, kept in memory and added every
+# USAGE_FLUSH_SECONDS to the shared totals in utils/api_usage.py (one row per key,
+# whatever the number of workers and restarts; read by the API Management page).
+USAGE_FLUSH_SECONDS = 5.0
+_USAGE = {}
+_USAGE_LOCK = threading.Lock()
+_USAGE_FLUSHED = {"at": time.monotonic()}
+
+def record_usage(api_key, requests=0, sent_bytes=0, throttled=0):
+    """Adds to the key's counters; True when it's time to flush_usage()."""
+    with _USAGE_LOCK:
+        counters = _USAGE.setdefault(api_key, {"requests": 0, "bytes": 0, "throttled": 0, "last_seen": None})
+        counters["requests"] += requests
+        counters["bytes"] += sent_bytes
+        counters["throttled"] += throttled
+        counters["last_seen"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        due = time.monotonic() - _USAGE_FLUSHED["at"] >= USAGE_FLUSH_SECONDS
+        if due:
+            # Claim this flush so concurrent requests don't all write the file
+            _USAGE_FLUSHED["at"] = time.monotonic()
+    return due
+
+def flush_usage():
+    """Adds the counters recorded since the last flush to the stored totals."""
+    with _USAGE_LOCK:
+        pending = dict(_USAGE)
+        _USAGE.clear()
+        _USAGE_FLUSHED["at"] = time.monotonic()
+    if not pending:
+        return
+    try:
+        add_usage(pending)
+    except Exception as e:
+        print(f"Error writing API usage: {e}")
+        # Put them back for the next flush
+        with _USAGE_LOCK:
+            for api_key, counters in pending.items():
+                total = _USAGE.setdefault(api_key, {"requests": 0, "bytes": 0, "throttled": 0, "last_seen": None})
+                for name in ("requests", "bytes", "throttled"):
+                    total[name] += counters[name]
+                total["last_seen"] = max(filter(None, [total["last_seen"], counters["last_seen"]]), default=None)
+
+@app.middleware("http")
+async def count_usage(request: Request, call_next):
+    """Counts each authenticated request and the bytes actually sent for it."""
+    response = await call_next(request)
+    api_key = getattr(request.state, "api_key", None)
+    if api_key is None:
+        return response
+
+    body = response.body_iterator
+    async def counted_body():
+        sent = 0
+        try:
+            async for chunk in body:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            if record_usage(api_key, requests=1, sent_bytes=sent):
+                _EXECUTOR.submit(flush_usage)
+    response.body_iterator = counted_body()
+    return response
+
+async def get_api_key(request: Request, api_key_header: str = Security(api_key_header)):
+    """Validates if the provided key exists in our database, then applies its rate limit."""
     valid_keys = get_valid_keys()
     
     # Also keep the master secret as a fallback if needed (Optional)
     # if api_key_header == "otep-secret-2025": return api_key_header
     
-    if api_key_header in valid_keys:
-        return api_key_header
-    else:
+    if api_key_header not in valid_keys:
         raise HTTPException(status_code=403, detail="Invalid or Missing API Key")
 
+    wait = take_token(api_key_header, valid_keys[api_key_header])
+    if wait > 0:
+        if record_usage(api_key_header, throttled=1):
+            _EXECUTOR.submit(flush_usage)
+        raise HTTPException(status_code=429, detail="Rate limit exceeded for this API key",
+                            headers={"Retry-After": str(math.ceil(wait))})
+    request.state.api_key = api_key_header
+    return api_key_header
+
 # --- DATA HELPER ---
+def dumps(content):
+    """JSON bytes via orjson: NaN / inf -> null, numpy scalars and datetimes handled natively."""
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _column_values(series):
+    """One column as a plain Python list for dumps() (blank dates -> None)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return [None if pd.isna(v) else v.isoformat() for v in series]
+    # Blank numbers / text come out as NaN, which dumps() writes as null
+    return series.tolist()
+
+def to_records(df):
+    """Rows as dicts built column by column, without the loader's period columns."""
+    columns = [c for c in df.columns if c not in PERIOD_COLUMNS]
+    values = [_column_values(df[c]) for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
 def load_data(sheet_name):
     if not os.path.exists(DATA_FILE):
         return None
     try:
-        df = pd.read_excel(DATA_FILE, sheet_name=sheet_name)
-        if 'Year' in df.columns: df['Year'] = df['Year'].astype(str)
-        df = df.where(pd.notnull(df), None)
-        return df.to_dict(orient="records")
+        # Served from the columnar snapshot (Year is already a string there)
+        df = get_sheet(sheet_name)
+        if df is None:
+            return None
+        return to_records(df)
     except Exception as e:
         print(f"Error loading {sheet_name}: {e}")
         return None
 
+# --- ROW QUERIES ---
+# fields= / from= / to= / category= / item= / limit= / cursor= on the sheet endpoints.
+# Rows are picked by position from the period-sorted frame and the lookup index,
+# so only the requested page is ever converted to JSON.
+MAX_PAGE_SIZE = 10000
+
+async def row_query(
+    fields: str = Query(None, description="Comma-separated columns to return"),
+    start_key: int = Query(None, alias="from", description="First period, YYYYMM (e.g. 256801)"),
+    end_key: int = Query(None, alias="to", description="Last period, YYYYMM (e.g. 256812)"),
+    category: str = None,
+    item: str = None,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    fmt: str = Query(None, alias="format", pattern="^(json|ndjson|csv|arrow)$", description="json (default), ndjson, csv or arrow"),
+):
+    """Optional query parameters shared by the sheet endpoints."""
+    return {"fields": fields, "from": start_key, "to": end_key, "category": category,
+            "item": item, "limit": limit, "cursor": cursor,
+            "format": fmt if fmt != "json" else None}
+
+def encode_cursor(version, position):
+    return base64.urlsafe_b64encode(f"{version}:{position}".encode()).decode()
+
+def decode_cursor(cursor, version):
+    """Row position the previous page ended at; cursors only work for the version they came from."""
+    try:
+        cursor_version, position = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(":", 1)
+        position = int(position)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_version != version:
+        raise HTTPException(status_code=410, detail="Cursor expired: the data was updated, start again without a cursor")
+    return position
+
+def select_positions(df, params):
+    """Ascending row positions matching the period range and Category / Item filters."""
+    start_key, end_key = params.get("from"), params.get("to")
+    if (start_key is not None or end_key is not None) and "SortKey" not in df.columns:
+        raise HTTPException(status_code=400, detail="This dataset has no Year/Month period to filter on")
+
+    key_columns = [c for c in ("Category", "Item") if params.get(c.lower()) is not None]
+    missing = [c for c in key_columns if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"This dataset has no column {missing}")
+    if key_columns:
+        index = get_lookup(df, key_columns)
+        return lookup_positions(index, tuple(params[c.lower()] for c in key_columns), start_key, end_key)
+
+    lo, hi = 0, len(df)
+    if "SortKey" in df.columns:
+        keys = df["SortKey"].to_numpy()
+        if start_key is not None: lo = keys.searchsorted(start_key, side='left')
+        if end_key is not None: hi = keys.searchsorted(end_key, side='right')
+    return np.arange(lo, hi)
+
+def select_page(df, version, params):
+    """Returns (row positions, columns, next_cursor) for fields / filters / limit / cursor."""
+    columns = [c for c in df.columns if c not in PERIOD_COLUMNS]
+    if params.get("fields"):
+        fields = [f.strip() for f in params["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}; available: {columns}")
+        columns = fields
+
+    positions = select_positions(df, params)
+    if params.get("cursor"):
+        after = decode_cursor(params["cursor"], version)
+        positions = positions[positions.searchsorted(after, side='right'):]
+
+    next_cursor = None
+    limit = params.get("limit")
+    if limit is not None and len(positions) > limit:
+        positions = positions[:limit]
+        next_cursor = encode_cursor(version, positions[-1])
+    return positions, columns, next_cursor
+
+def query_payload(sheet_name, version, params):
+    """JSON body for a filtered / projected / paginated request (not cached)."""
+    df = get_sheet(sheet_name) if version is not None else None
+    if df is None:
+        return dumps({"data": None, "next_cursor": None})
+
+    positions, columns, next_cursor = select_page(df, version, params)
+    data = to_records(df.iloc[positions][columns])
+    return dumps({"data": data, "next_cursor": next_cursor})
+
+# --- STREAMING EXPORT ---
+# format=ndjson / csv / arrow: the selected rows are sent STREAM_CHUNK_ROWS at a time,
+# so memory stays bounded and the first bytes go out before the whole sheet is encoded.
+STREAM_CHUNK_ROWS = 5000
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def _chunks(positions):
+    for start in range(0, len(positions), STREAM_CHUNK_ROWS):
+        yield positions[start:start + STREAM_CHUNK_ROWS]
+
+def _ndjson_chunks(df, positions, columns):
+    for chunk in _chunks(positions):
+        yield b"".join(orjson.dumps(r, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+                       for r in to_records(df.iloc[chunk][columns]))
+
+def _csv_chunks(df, positions, columns):
+    # BOM so Excel opens the Thai text correctly, like the dashboard's CSV download
+    yield "\ufeff".encode("utf-8")
+    first = True
+    for chunk in _chunks(positions):
+        yield df.iloc[chunk][columns].to_csv(index=False, header=first).encode("utf-8")
+        first = False
+    if first:
+        yield (",".join(columns) + "\n").encode("utf-8")
+
+def _arrow_chunks(table, positions, columns):
+    """Arrow IPC stream taken directly from the memory-mapped snapshot (no pandas round trip)."""
+    table = table.select(columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for chunk in _chunks(positions):
+            if chunk[-1] - chunk[0] + 1 == len(chunk):
+                # Contiguous rows (e.g. a plain period range): zero-copy slice
+                batch = table.slice(int(chunk[0]), len(chunk))
+            else:
+                batch = table.take(pa.array(chunk))
+            writer.write_table(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+def stream_response(sheet_name, version, params):
+    """StreamingResponse for format=ndjson|csv|arrow; validation happens before the first byte."""
+    fmt = params["format"]
+    df = get_sheet(sheet_name) if version is not None else None
+    if df is None:
+        raise HTTPException(status_code=404, detail="No data uploaded for this dataset")
+
+    positions, columns, next_cursor = select_page(df, version, params)
+    if fmt == "arrow":
+        table = get_sheet_table(sheet_name)
+        if table is None:
+            raise HTTPException(status_code=404, detail="No data uploaded for this dataset")
+        body = _arrow_chunks(table, positions, columns)
+    elif fmt == "csv":
+        body = _csv_chunks(df, positions, columns)
+    else:
+        body = _ndjson_chunks(df, positions, columns)
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return StreamingResponse(body, media_type=STREAM_MEDIA_TYPES[fmt], headers=headers)
+
+# --- CONCURRENCY ---
+# Handlers are async. Cached bodies are served from memory on the event loop; work that
+# touches disk or pandas runs on a small dedicated thread pool, and each endpoint may have
+# at most ENDPOINT_CONCURRENCY such jobs in flight. Others wait up to QUEUE_TIMEOUT
+# seconds and then get 503, so one heavy route can't tie up every worker.
+EXECUTOR_WORKERS = 4
+ENDPOINT_CONCURRENCY = 4
+ENDPOINT_CONCURRENCY_OVERRIDES = {"/api/v1/{dataset}/aggregate": 2}
+QUEUE_TIMEOUT = 10.0
+_EXECUTOR = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="api-data")
+_SLOTS = {}
+
+def endpoint_slots(request):
+    """Semaphore for the request's route (created on first use)."""
+    route = request.scope.get("route")
+    path = route.path if route is not None else request.url.path
+    if path not in _SLOTS:
+        _SLOTS[path] = asyncio.Semaphore(ENDPOINT_CONCURRENCY_OVERRIDES.get(path, ENDPOINT_CONCURRENCY))
+    return _SLOTS[path]
+
+async def run_blocking(request, func, *args):
+    """Runs func(*args) on the data executor, within the endpoint's concurrency limit."""
+    slots = endpoint_slots(request)
+    try:
+        await asyncio.wait_for(slots.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_EXECUTOR, func, *args)
+    finally:
+        slots.release()
+
+# --- RESPONSE CACHE ---
+# Serialized {"data": [...]} bodies per sheet,
+# tagged with the workbook version they were built from. An upload changes the version, so the next request rebuilds them
+# (and drops every body of the older version, see evict_stale()).
+# Compressed copies are stored next to the plain body, so each encoding is paid once.
+_RESPONSE_CACHE = {}
+_RESPONSE_LOCK = threading.Lock()
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 keeps the bytes identical for the same body (strong ETag)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+def negotiate_encoding(request):
+    """Best of br / gzip / identity allowed by Accept-Encoding (q-values honoured)."""
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+
+    best, best_q = "identity", 0.0
+    for encoding in (["br"] if brotli else []) + ["gzip"]:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def cached_payload(sheet_name, version, encoding="identity"):
+    """The cached body if it is ready, else None (never builds, so safe on the event loop)."""
+    cached = _RESPONSE_CACHE.get(sheet_name)
+    if cached and cached[0] == version:
+        return cached[1].get(encoding)
+    return None
+
+def evict_stale(version):
+    """Drops cached sheet and batch bodies of any other workbook version. Call with _RESPONSE_LOCK held."""
+    for key in [k for k, (v, _) in _RESPONSE_CACHE.items() if v != version]:
+        del _RESPONSE_CACHE[key]
+    with _BATCH_LOCK:
+        for key in [k for k, (v, _) in _BATCH_CACHE.items() if v != version]:
+            del _BATCH_CACHE[key]
+
+def get_payload(sheet_name, version, encoding="identity"):
+    """Returns the JSON body for a sheet, serializing (and compressing) it once per workbook version."""
+    body = cached_payload(sheet_name, version, encoding)
+    if body is not None:
+        return body
+
+    # Load (or convert) the snapshot first, so _RESPONSE_LOCK is only held while serializing
+    get_datasets()
+    with _RESPONSE_LOCK:
+        # Another request may have built it while we waited
+        cached = _RESPONSE_CACHE.get(sheet_name)
+        if not cached or cached[0] != version:
+            data = load_data(sheet_name)
+            body = dumps({"data": data})
+            # Not cached under this version if the snapshot for it is still being converted
+            if data is None or get_loaded_version() != version:
+                return compress(body, encoding)
+            cached = (version, {"identity": body})
+            evict_stale(version)
+            _RESPONSE_CACHE[sheet_name] = cached
+        bodies = cached[1]
+        if encoding not in bodies:
+            bodies[encoding] = compress(bodies["identity"], encoding)
+        return bodies[encoding]
+
+# --- CONDITIONAL GET ---
+# Strong ETag per (sheet, workbook version): clients polling with If-None-Match or
+# If-Modified-Since get an empty 304 until the workbook is uploaded again.
+def make_etag(sheet_name, version, params=None, encoding="identity"):
+    # Each query and each content encoding is its own representation
+    suffix = f"-{encoding}" if encoding != "identity" else ""
+    if not params:
+        return f'"{sheet_name}-{version}{suffix}"'
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    return f'"{sheet_name}-{version}-{digest}{suffix}"'
+
+def is_not_modified(request, etag, modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since (RFC 9110); weak comparison for GET
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole-second precision
+    return int(modified) <= since
+
+def build_served(build, version):
+    """Runs build(version); also says whether its rows came from that version's snapshot.
+
+    While another process converts a new upload, the frames lag the file version.
+    """
+    get_datasets()
+    loaded = get_loaded_version()
+    body = build(version)
+    return body, loaded == version == get_loaded_version()
+
+async def conditional_response(request, sheet_name, params, build, encoding="identity", peek=None):
+    """Sends build(version) with ETag / Last-Modified, or an empty 304 if the client is up to date.
+
+    build() must return bytes already in the given content encoding (or a Response); it
+    runs on the data executor unless peek(version) already has the bytes in memory.
+    A body built from an older snapshot is sent without validators and is not stored.
+    """
+    version = get_data_version()
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if version is not None:
+        modified = get_data_modified()
+        headers["ETag"] = make_etag(sheet_name, version, params, encoding)
+        if modified is not None:
+            headers["Last-Modified"] = formatdate(modified, usegmt=True)
+        # Let caches keep the body but check back with us before reusing it
+        headers["Cache-Control"] = "no-cache"
+        if is_not_modified(request, headers["ETag"], modified):
+            return Response(status_code=304, headers=headers)
+    body = peek(version) if peek is not None else None
+    if body is None:
+        body, current = await run_blocking(request, build_served, build, version)
+        if not current:
+            headers.pop("ETag", None)
+            headers.pop("Last-Modified", None)
+            headers["Cache-Control"] = "no-store"
+    if isinstance(body, Response):
+        # Streaming formats build their own response
+        body.headers.update(headers)
+        return body
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def sheet_response(request, sheet_name, query=None):
+    params = {k: v for k, v in (query or {}).items() if v is not None}
+    if params.get("format"):
+        return await conditional_response(request, sheet_name, params, lambda version: stream_response(sheet_name, version, params))
+    if params:
+        return await conditional_response(request, sheet_name, params, lambda version: query_payload(sheet_name, version, params))
+    encoding = negotiate_encoding(request)
+    return await conditional_response(request, sheet_name, params, lambda version: get_payload(sheet_name, version, encoding), encoding,
+                                      peek=lambda version: cached_payload(sheet_name, version, encoding))
+
+# --- AGGREGATION ---
+# The dashboards' reductions (period sums, latest-month snapshot, group totals)
+# computed here on the cached frame, so clients receive a few rows instead of the sheet.
+SHEET_DATASETS = {
+    "eis": "EIS_Data",
+    "procurement": "Procure_Data",
+    "finance": "Finance_Data",
+    "treasury": "Treasury_Data",
+    "welfare": "Welfare_Data",
+    "dorm": "Dorm_Data",
+}
+AGGREGATE_DATASETS = {**SHEET_DATASETS, "legal": "Legal_Data"}
+
+def split_names(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+def to_scalar(value):
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+def aggregate_payload(sheet_name, version, params):
+    """Groups the selected rows and reduces the value columns with sum / last / max.
+
+    "last" mirrors the dashboards' snapshot cards: only the latest month in the
+    range is kept (its SortKey is returned as "period"), then summed per group.
+    """
+    df = get_sheet(sheet_name) if version is not None else None
+    if df is None:
+        return dumps({"data": None})
+
+    columns = [c for c in df.columns if c not in PERIOD_COLUMNS]
+    group_by = split_names(params.get("group_by"))
+    unknown = [c for c in group_by if c not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by columns {unknown}; available: {columns}")
+
+    numeric = [c for c in columns if c not in group_by and pd.api.types.is_numeric_dtype(df[c])]
+    values = split_names(params.get("values")) or numeric
+    invalid = [c for c in values if c not in numeric]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Not numeric value columns {invalid}; available: {numeric}")
+
+    agg = params.get("agg", "sum")
+    if agg == "last" and "SortKey" not in df.columns:
+        raise HTTPException(status_code=400, detail="agg=last needs a dataset with Year/Month periods")
+
+    rows = df.iloc[select_positions(df, params)]
+    result = {}
+    if agg == "last":
+        period = rows["SortKey"].iloc[-1] if len(rows) else None
+        rows = slice_period(rows, period, period) if period is not None else rows
+        result["period"] = to_scalar(period) if period is not None else None
+
+    reducer = "max" if agg == "max" else "sum"
+    if group_by:
+        grouped = rows.groupby(group_by, sort=True, observed=True)[values].agg(reducer).reset_index()
+        result["data"] = to_records(grouped)
+    else:
+        result["data"] = [{c: to_scalar(getattr(rows[c], reducer)()) for c in values}]
+    return dumps(result)
+
+# --- BATCH ---
+# /api/v1/batch?datasets=eis,finance,...: several sheets in one response, keyed by dataset.
+# Each part is the exact body the dataset's own endpoint sends, so cached sheet bytes
+# are spliced in without being encoded again. Only compressed whole-sheet batches are
+# kept (the last BATCH_CACHE_SIZE, most recently used last); plain ones are spliced per request.
+_BATCH_CACHE = collections.OrderedDict()
+_BATCH_LOCK = threading.Lock()
+BATCH_CACHE_SIZE = 8
+
+def batch_datasets(value):
+    """Requested dataset names, validated and in a fixed order (one cache entry per set)."""
+    names = split_names(value)
+    unknown = [n for n in names if n not in SHEET_DATASETS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown datasets {unknown}; available: {list(SHEET_DATASETS)}")
+    return [n for n in SHEET_DATASETS if n in names]
+
+def splice_batch(names, parts):
+    return b"{" + b",".join(dumps(name) + b":" + part for name, part in zip(names, parts)) + b"}"
+
+def cached_batch(names, version, encoding="identity"):
+    """The whole-sheet batch body if it can be had from memory, else None (never builds)."""
+    if encoding == "identity":
+        parts = [cached_payload(SHEET_DATASETS[name], version) for name in names]
+        return None if None in parts else splice_batch(names, parts)
+    key = (tuple(names), encoding)
+    with _BATCH_LOCK:
+        cached = _BATCH_CACHE.get(key)
+        if cached and cached[0] == version:
+            _BATCH_CACHE.move_to_end(key)
+            return cached[1]
+    return None
+
+def batch_payload(names, version, params, encoding="identity"):
+    """{"<dataset>": {"data": [...]}, ...}, spliced from the per-sheet bodies."""
+    if params:
+        return splice_batch(names, [query_payload(SHEET_DATASETS[name], version, params) for name in names])
+    body = cached_batch(names, version, encoding)
+    if body is not None:
+        return body
+
+    body = splice_batch(names, [get_payload(SHEET_DATASETS[name], version) for name in names])
+    if encoding == "identity":
+        return body
+    body = compress(body, encoding)
+    if version is not None and get_loaded_version() == version:
+        key = (tuple(names), encoding)
+        with _BATCH_LOCK:
+            _BATCH_CACHE[key] = (version, body)
+            _BATCH_CACHE.move_to_end(key)
+            while len(_BATCH_CACHE) > BATCH_CACHE_SIZE:
+                _BATCH_CACHE.popitem(last=False)
+    return body
+
 # --- ENDPOINTS ---
 @app.get("/")
-def home():
+async def home():
     return {"message": "OTEP API Active. Authentication required."}
 
+@app.get("/api/v1/{dataset}/aggregate", dependencies=[Depends(get_api_key)])
+async def get_aggregate(
+    request: Request,
+    dataset: str,
+    group_by: str = Query(None, description="Comma-separated columns, e.g. Category,Item"),
+    values: str = Query(None, description="Comma-separated numeric columns (default: all)"),
+    agg: str = Query("sum", pattern="^(sum|last|max)$"),
+    start_key: int = Query(None, alias="from", description="First period, YYYYMM"),
+    end_key: int = Query(None, alias="to", description="Last period, YYYYMM"),
+    category: str = None,
+    item: str = None,
+):
+    sheet_name = AGGREGATE_DATASETS.get(dataset)
+    if sheet_name is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{dataset}'; available: {list(AGGREGATE_DATASETS)}")
+    params = {"aggregate": True, "group_by": group_by, "values": values, "agg": agg, "from": start_key,
+              "to": end_key, "category": category, "item": item}
+    params = {k: v for k, v in params.items() if v is not None}
+    return await conditional_response(request, sheet_name, params, lambda version: aggregate_payload(sheet_name, version, params))
+
+@app.get("/api/v1/batch", dependencies=[Depends(get_api_key)])
+async def get_batch(
+    request: Request,
+    datasets: str = Query(..., description="Comma-separated datasets, e.g. eis,finance,treasury"),
+    query: dict = Depends(row_query),
+):
+    names = batch_datasets(datasets)
+    params = {k: v for k, v in query.items() if v is not None}
+    if params.get("format") or params.get("cursor"):
+        raise HTTPException(status_code=400, detail="format and cursor apply to one dataset; use its own endpoint")
+    cache_key = "batch:" + "+".join(names)
+    if params:
+        return await conditional_response(request, cache_key, params, lambda version: batch_payload(names, version, params))
+    encoding = negotiate_encoding(request)
+    return await conditional_response(request, cache_key, params, lambda version: batch_payload(names, version, params, encoding), encoding,
+                                      peek=lambda version: cached_batch(names, version, encoding))
+
 @app.get("/api/v1/eis", dependencies=[Depends(get_api_key)])
-def get_eis():
-    return {"data": load_data("EIS_Data")}
+async def get_eis(request: Request, query: dict = Depends(row_query)):
+    return await sheet_response(request, "EIS_Data", query)
 
 @app.get("/api/v1/procurement", dependencies=[Depends(get_api_key)])
-def get_procure():
-    return {"data": load_data("Procure_Data")}
+async def get_procure(request: Request, query: dict = Depends(row_query)):
+    return await sheet_response(request, "Procure_Data", query)
 
 @app.get("/api/v1/finance", dependencies=[Depends(get_api_key)])
-def get_finance():
-    return {"data": load_data("Finance_Data")}
+async def get_finance(request: Request, query: dict = Depends(row_query)):
+    return await sheet_response(request, "Finance_Data", query)
 
 @app.get("/api/v1/treasury", dependencies=[Depends(get_api_key)])
-def get_treasury():
-    return {"data": load_data("Treasury_Data")}
+async def get_treasury(request: Request, query: dict = Depends(row_query)):
+    return await sheet_response(request, "Treasury_Data", query)
 
 @app.get("/api/v1/welfare", dependencies=[Depends(get_api_key)])
-def get_welfare():
-    return {"data": load_data("Welfare_Data")}
+async def get_welfare(request: Request, query: dict = Depends(row_query)):
+    return await sheet_response(request, "Welfare_Data", query)
 
 @app.get("/api/v1/dorm", dependencies=[Depends(get_api_key)])
-def get_dorm():
-    return {"data": load_data("Dorm_Data")}
+async def get_dorm(request: Request, query: dict = Depends(row_query)):
+    return await sheet_response(request, "Dorm_Data", query)
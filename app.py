@@ -7,7 +7,9 @@ import pandas as pd
 import io
 import json
 from utils.styles import load_css
-from utils.data_loader import save_and_load_excel, load_from_disk
+from utils.data_loader import save_and_load_excel, load_from_disk, is_session_stale
+from utils.dataset_store import clear_cache, publish_snapshot, get_memory_report, get_ingest_report
+from utils.periods import PERIOD_COLUMNS
 from utils import auth
 from utils import email_service
 from utils.logger import log_action
@@ -124,6 +126,8 @@ def show_upload_view():
     
     if st.session_state.get('data_loaded', False):
         st.success(f"สถานะข้อมูล: ✅ พร้อมใช้งาน (Source: {st.session_state.get('last_loaded_file', 'Saved File')})")
+        with st.expander("⏱️ เวลาประมวลผลแต่ละ Sheet (Ingestion Timing)"):
+            st.dataframe(get_ingest_report(), use_container_width=True, hide_index=True)
     else:
         st.warning("สถานะข้อมูล: ⚠️ ยังไม่มีข้อมูลในระบบ")
 
@@ -134,6 +138,8 @@ def show_upload_view():
     if st.button("🔄 บังคับโหลดข้อมูลใหม่ (Force Refresh)", type="primary"):
         with st.spinner("กำลังล้างค่าและโหลดข้อมูลใหม่..."):
             st.cache_data.clear()
+            publish_snapshot()
+            clear_cache()
             keys_to_clear = [
                 'df_eis', 'df_eis_extra', 'df_procure', 'df_strategy', 
                 'df_finance', 'df_treasury', 'df_welfare', 'df_dorm',
@@ -151,6 +157,13 @@ def show_upload_view():
             else:
                 st.error("❌ ไม่พบไฟล์ข้อมูลในระบบ")
 
+    with st.expander("🧠 การใช้หน่วยความจำ (Memory Usage)"):
+        st.caption("Mapped = ใช้หน้าหน่วยความจำร่วมกันจากไฟล์ snapshot (แชร์ระหว่าง Streamlit และ API) | Resident = สำเนาส่วนตัวของโปรเซสนี้")
+        mem_report = get_memory_report()
+        st.dataframe(mem_report, use_container_width=True, hide_index=True)
+        if not mem_report.empty:
+            st.write(f"**รวม:** Mapped {mem_report['Mapped_Bytes'].sum() / 1e6:,.2f} MB | Resident {mem_report['Resident_Bytes'].sum() / 1e6:,.2f} MB")
+
 # 3.2 DOWNLOAD VIEW
 def show_download_view():
     st.markdown("## 📥 ดาวน์โหลดข้อมูล (Download Data)")
@@ -175,7 +188,9 @@ def show_download_view():
     session_key = dataset_map[selected_dataset_name]
 
     if session_key in st.session_state and isinstance(st.session_state[session_key], pd.DataFrame) and not st.session_state[session_key].empty:
+        # Export the sheet's own columns (not the loader-computed period columns)
         df = st.session_state[session_key]
+        df = df.drop(columns=[c for c in PERIOD_COLUMNS if c in df.columns])
         st.write(f"**ตัวอย่างข้อมูล ({len(df)} แถว):**")
         st.dataframe(df.head(5), use_container_width=True)
         col1, col2 = st.columns(2)
@@ -340,7 +355,8 @@ else:
     elif st.sidebar.button("🚪 ออกจากระบบ (Log off)", use_container_width=True):
         logout_user()
 
-    if 'df_eis' not in st.session_state: load_from_disk()
+    # Re-point this session at the shared data if another admin uploaded a new file
+    if 'df_eis' not in st.session_state or is_session_stale(): load_from_disk()
 
     # --- ANALYTICS TRACKING ---
     if 'last_view_logged' not in st.session_state: st.session_state.last_view_logged = None
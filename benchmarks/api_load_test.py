@@ -0,0 +1,111 @@
+"""Latency of the /api/v1 endpoints under concurrent clients.
+
+Run from the project root with a workbook already uploaded (data/otep_data_saved.xlsx):
+
+    python benchmarks/api_load_test.py [requests_per_client]
+
+Starts the API with uvicorn on a free local port from a temporary working directory
+that links to the project's data/ workbook and snapshot and has its own
+api_keys.json with one unlimited key, so nothing is added to the real key file.
+Then for 50, 200 and 500 concurrent clients has each client request the endpoints
+in turn and prints p50 / p95 / p99 latency, requests per second and the number of
+non-200 responses (e.g. 503 when a route's queue is full).
+"""
+import asyncio
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONCURRENCY = [50, 200, 500]
+PATHS = [
+    "/api/v1/eis", "/api/v1/procurement", "/api/v1/finance",
+    "/api/v1/treasury", "/api/v1/welfare", "/api/v1/dorm",
+    "/api/v1/eis?limit=100", "/api/v1/eis/aggregate?group_by=Category",
+]
+
+def make_workdir(workdir, key):
+    """data/ -> the project's workbook and snapshot; api_keys.json with only the test key."""
+    data = os.path.join(workdir, "data")
+    os.makedirs(data)
+    for name in ("otep_data_saved.xlsx", "snapshot"):
+        source = os.path.join(ROOT, "data", name)
+        if os.path.exists(source):
+            os.symlink(source, os.path.join(data, name))
+    with open(os.path.join(workdir, "api_keys.json"), "w") as f:
+        json.dump({key: {"name": "load test", "rate_limit": 0, "burst": 0}}, f)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+async def client_run(client, headers, n, latencies, errors):
+    for i in range(n):
+        path = PATHS[i % len(PATHS)]
+        started = time.perf_counter()
+        try:
+            r = await client.get(path, headers=headers)
+            await r.aread()
+            if r.status_code != 200:
+                errors.append(r.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+
+async def run_level(base_url, headers, clients, n):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_run(client, headers, n, latencies, errors) for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    print(f"{clients:>8} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {len(latencies) / elapsed:>9.0f} {len(errors):>7}")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    key = "loadtest-" + secrets.token_hex(8)
+    workdir = tempfile.TemporaryDirectory(prefix="api-load-")
+    make_workdir(workdir.name, key)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--app-dir", ROOT, "--port", str(port), "--log-level", "warning"],
+        cwd=workdir.name)
+    try:
+        wait_until_up(base_url)
+        headers = {"X-API-KEY": key, "Accept-Encoding": "gzip"}
+        for path in PATHS:
+            httpx.get(base_url + path, headers=headers, timeout=60)  # warm up caches
+
+        print(f"{n} requests per client over {len(PATHS)} endpoints")
+        print(f"{'clients':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+        for clients in CONCURRENCY:
+            asyncio.run(run_level(base_url, headers, clients, n))
+    finally:
+        server.terminate()
+        server.wait()
+        workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
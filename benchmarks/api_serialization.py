@@ -0,0 +1,67 @@
+"""Request throughput of the /api/v1 sheet endpoints, old JSON encoder vs. the orjson path.
+
+Run from the project root with a workbook already uploaded (data/otep_data_saved.xlsx):
+
+    python benchmarks/api_serialization.py [requests_per_endpoint]
+
+"before" is the previous path (DataFrame.astype(object).where(...).to_dict() +
+FastAPI's jsonable_encoder / JSONResponse), "after" is api.to_records() + api.dumps().
+The response cache is cleared before every request so each one pays for serialization;
+"cached" is the normal steady state where the body is reused until the next upload.
+"""
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+import api
+from utils.periods import PERIOD_COLUMNS
+
+ENDPOINTS = ["eis", "procurement", "finance", "treasury", "welfare", "dorm"]
+
+def legacy_to_records(df):
+    df = df.drop(columns=[c for c in PERIOD_COLUMNS if c in df.columns])
+    df = df.astype(object).where(pd.notnull(df), None)
+    return df.to_dict(orient="records")
+
+def legacy_dumps(content):
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+def requests_per_second(client, path, n, clear_cache):
+    client.get(path)  # warm up (loads the snapshot)
+    started = time.perf_counter()
+    for _ in range(n):
+        if clear_cache:
+            api._RESPONSE_CACHE.clear()
+        response = client.get(path)
+        assert response.status_code == 200, response.text
+    return n / (time.perf_counter() - started), len(response.content)
+
+def run(n):
+    if api.get_data_version() is None:
+        print(f"No workbook at {api.DATA_FILE}; upload one first.")
+        return
+    api.app.dependency_overrides[api.get_api_key] = lambda: "benchmark"
+    client = TestClient(api.app)
+    new_records, new_dumps = api.to_records, api.dumps
+
+    rows = []
+    for endpoint in ENDPOINTS:
+        path = f"/api/v1/{endpoint}"
+        api.to_records, api.dumps = legacy_to_records, legacy_dumps
+        before, size = requests_per_second(client, path, n, clear_cache=True)
+        api.to_records, api.dumps = new_records, new_dumps
+        after, _ = requests_per_second(client, path, n, clear_cache=True)
+        cached, _ = requests_per_second(client, path, n, clear_cache=False)
+        rows.append({"Endpoint": path, "Bytes": size, "Before (req/s)": round(before, 1),
+                     "After (req/s)": round(after, 1), "Speedup": f"{after / before:.1f}x",
+                     "Cached (req/s)": round(cached, 1)})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
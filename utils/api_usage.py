@@ -0,0 +1,90 @@
+import os
+import json
+import sqlite3
+import contextlib
+import threading
+
+USAGE_DB = "data/api_usage.db"
+USAGE_FOLDER = "data/api_usage" # Per-process JSON counter files of older versions, folded into USAGE_DB once
+
+# --- USAGE STORE ---
+# One row of counters per API key. Each API worker adds what it counted since its
+# last flush (SQLite serializes the writers), so the table stays one row per key
+# however many workers and restarts there have been.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    api_key TEXT PRIMARY KEY,
+    requests INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    throttled INTEGER NOT NULL,
+    last_seen TEXT
+) WITHOUT ROWID;
+"""
+_UPSERT = """
+INSERT INTO usage (api_key, requests, bytes, throttled, last_seen) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (api_key) DO UPDATE SET
+    requests = requests + excluded.requests,
+    bytes = bytes + excluded.bytes,
+    throttled = throttled + excluded.throttled,
+    last_seen = CASE WHEN excluded.last_seen > COALESCE(last_seen, '') THEN excluded.last_seen ELSE last_seen END
+"""
+_STORE = {"ready": False}
+_STORE_LOCK = threading.Lock()
+
+def _rows(usage):
+    return [(key, c.get("requests", 0), c.get("bytes", 0), c.get("throttled", 0), c.get("last_seen"))
+            for key, c in usage.items()]
+
+def _fold_old_files(conn):
+    """Adds the counter files of older versions to the table and deletes them."""
+    if not os.path.isdir(USAGE_FOLDER):
+        return
+    # Holds the write lock from here, so two processes never fold the same file
+    conn.execute("BEGIN IMMEDIATE")
+    for filename in os.listdir(USAGE_FOLDER):
+        path = os.path.join(USAGE_FOLDER, filename)
+        if filename.endswith(".json"):
+            try:
+                with open(path, "r") as f:
+                    conn.executemany(_UPSERT, _rows(json.load(f)))
+            except Exception as e:
+                print(f"Error reading API usage file {filename}: {e}")
+        os.remove(path)
+    conn.commit()
+    try: os.rmdir(USAGE_FOLDER)
+    except OSError: pass
+
+def _connect():
+    conn = sqlite3.connect(USAGE_DB, timeout=10)
+    if not _STORE["ready"]:
+        with _STORE_LOCK:
+            if not _STORE["ready"]:
+                conn.executescript(_SCHEMA)
+                _fold_old_files(conn)
+                _STORE["ready"] = True
+    return conn
+
+def add_usage(usage):
+    """Adds {api_key: {"requests", "bytes", "throttled", "last_seen"}} to the stored totals."""
+    if not os.path.exists("data"):
+        os.makedirs("data")
+    with contextlib.closing(_connect()) as conn:
+        with conn:
+            conn.executemany(_UPSERT, _rows(usage))
+
+def load_usage(keys):
+    """Stored counters of the given keys: {api_key: counters}. Keys no longer issued are left out."""
+    if not keys or not os.path.exists("data"):
+        return {}
+    with contextlib.closing(_connect()) as conn:
+        rows = conn.execute("SELECT api_key, requests, bytes, throttled, last_seen FROM usage").fetchall()
+    return {key: {"requests": requests, "bytes": sent, "throttled": throttled, "last_seen": last_seen}
+            for key, requests, sent, throttled, last_seen in rows if key in keys}
+
+def delete_usage(api_key):
+    """Drops a revoked key's counters."""
+    if not os.path.exists(USAGE_DB):
+        return
+    with contextlib.closing(_connect()) as conn:
+        with conn:
+            conn.execute("DELETE FROM usage WHERE api_key = ?", (api_key,))
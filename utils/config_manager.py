@@ -57,3 +57,29 @@ def is_feature_visible(feature_key):
     """Checks if a specific graph/section is visible."""
     settings = load_visibility_settings()
     return settings["features"].get(feature_key, True)
+
+# --- LOG RETENTION ---
+LOG_SETTINGS_FILE = "data/log_settings.json"
+
+# hot_months: months kept in the indexed log database (current month included);
+# older months are compacted into the archive. retention_months: months kept in
+# total; None keeps everything (audit rules), deleting only once an admin sets it.
+DEFAULT_LOG_SETTINGS = {
+    "hot_months": 3,
+    "retention_months": None
+}
+
+def load_log_settings():
+    """Loads the log retention config from JSON (defaults for missing keys)."""
+    try:
+        with open(LOG_SETTINGS_FILE, "r") as f:
+            return {**DEFAULT_LOG_SETTINGS, **json.load(f)}
+    except:
+        return dict(DEFAULT_LOG_SETTINGS)
+
+def save_log_settings(settings):
+    """Saves the log retention config to JSON."""
+    if not os.path.exists("data"):
+        os.makedirs("data")
+    with open(LOG_SETTINGS_FILE, "w") as f:
+        json.dump(settings, f)
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from utils.periods import PERIOD_COLUMNS
+
+# Key columns the cube is aggregated by ("" level = whole sheet). Levels whose
+# columns a sheet doesn't have are skipped.
+CUBE_LEVELS = [(), ("Category",), ("Category", "Item"), ("Group",)]
+
+def _value_columns(df):
+    return [c for c in df.columns
+            if c not in PERIOD_COLUMNS and pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+
+def build_cube(df):
+    """Monthly totals and running totals per level key, for every numeric column.
+
+    One row per (Level, key, SortKey) with Sum_<col> (that month) and Cum_<col>
+    (running total over the key's months). Returns None for sheets without SortKey.
+    """
+    if df is None or df.empty or "SortKey" not in df.columns:
+        return None
+    cols = _value_columns(df)
+
+    parts = []
+    for level in CUBE_LEVELS:
+        if any(c not in df.columns for c in level):
+            continue
+        keys = list(level) + ["SortKey"]
+        # sum() skips blanks like the cards' .sum() did; sorted by key, then period
+        monthly = df.groupby(keys, sort=True)[cols].sum().reset_index()
+        running = monthly.groupby(list(level), sort=False)[cols].cumsum() if level else monthly[cols].cumsum()
+
+        part = monthly[keys].copy()
+        part.insert(0, "Level", "|".join(level))
+        for c in cols:
+            part["Sum_" + c] = monthly[c]
+            part["Cum_" + c] = running[c]
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+def load_cube(cube_df):
+    """Turns a build_cube() frame into {level: {key: group}} for the lookups below."""
+    if cube_df is None or cube_df.empty:
+        return None
+    cols = [c[len("Sum_"):] for c in cube_df.columns if c.startswith("Sum_")]
+    cube = {"dtypes": {c: cube_df["Sum_" + c].dtype for c in cols}, "levels": {}}
+
+    for level_name, part in cube_df.groupby("Level", sort=False):
+        level = tuple(level_name.split("|")) if level_name else ()
+        periods = part["SortKey"].to_numpy()
+        sums = {c: part["Sum_" + c].to_numpy() for c in cols}
+        running = {c: part["Cum_" + c].to_numpy() for c in cols}
+        if level:
+            positions = part.groupby(list(level), sort=False).indices
+        else:
+            positions = {(): np.arange(len(part))}
+
+        groups = {}
+        for key, pos in positions.items():
+            if not isinstance(key, tuple):
+                key = (key,)
+            groups[key] = {
+                "periods": periods[pos],
+                "sum": {c: v[pos] for c, v in sums.items()},
+                "cum": {c: v[pos] for c, v in running.items()},
+            }
+        cube["levels"][level] = groups
+    return cube
+
+def _bounds(group, start_key, end_key):
+    periods = group["periods"]
+    return periods.searchsorted(start_key, side='left'), periods.searchsorted(end_key, side='right')
+
+def cube_sum(cube, level, key, col, start_key, end_key):
+    """Sum of col for key over start_key <= SortKey <= end_key: two lookups and a subtraction.
+
+    Raises KeyError if col is not a number column of the sheet (like df[col] would).
+    """
+    if not cube:
+        return 0
+    if col not in cube["dtypes"]:
+        raise KeyError(col)
+    zero = cube["dtypes"][col].type(0)
+    group = cube["levels"].get(tuple(level), {}).get(tuple(key))
+    if group is None:
+        return zero
+    lo, hi = _bounds(group, start_key, end_key)
+    if hi <= lo:
+        return zero
+    if hi - lo == 1:
+        # Single month (e.g. the latest snapshot): the stored monthly total, no rounding from the subtraction
+        return group["sum"][col][lo]
+    running = group["cum"][col]
+    return running[hi - 1] - (running[lo - 1] if lo > 0 else zero)
+
+def cube_keys(cube, level, start_key, end_key):
+    """Keys of a level that have rows between start_key and end_key, in sorted order."""
+    if not cube:
+        return []
+    keys = []
+    for key, group in cube["levels"].get(tuple(level), {}).items():
+        lo, hi = _bounds(group, start_key, end_key)
+        if hi > lo:
+            keys.append(key)
+    return sorted(keys)
+
+def latest_period(cube, start_key, end_key):
+    """Latest SortKey with data between start_key and end_key (None if there is none)."""
+    group = cube["levels"].get((), {}).get(()) if cube else None
+    if group is None:
+        return None
+    lo, hi = _bounds(group, start_key, end_key)
+    return group["periods"][hi - 1] if hi > lo else None
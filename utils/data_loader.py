@@ -1,57 +1,58 @@
 import streamlit as st
-import pandas as pd
 import os
-
-DATA_FOLDER = "data"
-DATA_FILE = os.path.join(DATA_FOLDER, "otep_data_saved.xlsx")
+import shutil
+from utils.dataset_store import DATA_FOLDER, DATA_FILE, SHEETS, get_data_version, get_datasets, get_loaded_version, get_cache_generation, publish_snapshot
 
 def save_and_load_excel(uploaded_file):
+    # Write to a temp file first so other sessions never read a half-written workbook
+    # (still named .xlsx: openpyxl only opens workbook extensions)
+    root, ext = os.path.splitext(DATA_FILE)
+    tmp_file = root + ".upload" + ext
     try:
         if not os.path.exists(DATA_FOLDER):
             os.makedirs(DATA_FOLDER)
-        with open(DATA_FILE, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        with open(tmp_file, "wb") as f:
+            # Copy in 1 MB blocks instead of materialising the whole upload again
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, f, 1024 * 1024)
+        # Convert once at upload time, before the new file replaces the old one;
+        # every reader loads the columnar snapshot afterwards
+        publish_snapshot(tmp_file)
         return load_from_disk()
     except Exception as e:
         st.error(f"Error saving file: {e}")
+        # e.g. a corrupt or non-xlsx upload that failed to convert
+        if os.path.exists(tmp_file):
+            try: os.remove(tmp_file)
+            except OSError: pass
         return False
 
 def load_from_disk():
     if not os.path.exists(DATA_FILE):
         return False
-        
+
     try:
-        def load_sheet(name):
-            try:
-                # Use openpyxl engine for better compatibility
-                df = pd.read_excel(DATA_FILE, sheet_name=name, engine='openpyxl')
-                # Force string for Year to avoid comma formatting (e.g. 2,568)
-                if 'Year' in df.columns:
-                    df['Year'] = df['Year'].astype(str)
-                return df
-            except:
-                return pd.DataFrame()
+        # Read first: a Force Refresh during the load then marks this session stale again
+        generation = get_cache_generation()
+        # Parsed once per process and shared; the session only keeps references
+        datasets = get_datasets()
+        if datasets is None:
+            return False
+        # Can lag the file while an upload is converting; the session reloads when it's done
+        version = get_loaded_version()
 
-        # Load all sheets
-        st.session_state['df_eis'] = load_sheet("EIS_Data")
-        
-        # ✅ FIX: Load the missing Extra Data for EIS Dashboard
-        st.session_state['df_eis_extra'] = load_sheet("EIS_Extra") 
-        
-        st.session_state['df_rev'] = load_sheet("Revenue_Data")
-        st.session_state['df_admin'] = load_sheet("Admin_Data")
-        st.session_state['df_audit'] = load_sheet("Audit_Data")
-        st.session_state['df_legal'] = load_sheet("Legal_Data")
-        st.session_state['df_hospital'] = load_sheet("Hospital_Data")
-        st.session_state['df_finance'] = load_sheet("Finance_Data")
-        st.session_state['df_treasury'] = load_sheet("Treasury_Data")
-        st.session_state['df_welfare'] = load_sheet("Welfare_Data")
-        st.session_state['df_dorm'] = load_sheet("Dorm_Data")
-        st.session_state['df_procure'] = load_sheet("Procure_Data")
-        st.session_state['df_strategy'] = load_sheet("Strategy_Data")
+        for key in SHEETS:
+            st.session_state[key] = datasets[key]
 
+        st.session_state['data_version'] = version
+        st.session_state['data_generation'] = generation
         st.session_state['data_loaded'] = True
         return True
     except Exception as e:
         st.error(f"Error reading saved data: {e}")
         return False
+
+def is_session_stale():
+    """True when the saved workbook changed, or the shared cache was cleared, since this session loaded it."""
+    return (st.session_state.get('data_version') != get_data_version()
+            or st.session_state.get('data_generation') != get_cache_generation())
@@ -0,0 +1,666 @@
+import os
+import json
+import time
+import datetime
+import threading
+import collections
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from openpyxl import load_workbook
+from utils.periods import THAI_MONTHS, PERIOD_COLUMNS, year_num, month_num
+from utils.lookup import LOOKUP_COLUMNS, build_index
+from utils.cube import build_cube, load_cube
+
+DATA_FOLDER = "data"
+DATA_FILE = os.path.join(DATA_FOLDER, "otep_data_saved.xlsx")
+
+# Columnar copy of the workbook (one Arrow/Feather file per sheet).
+# The xlsx stays as the archival original; all readers load from here.
+SNAPSHOT_FOLDER = os.path.join(DATA_FOLDER, "snapshot")
+MANIFEST_FILE = os.path.join(SNAPSHOT_FOLDER, "manifest.json")
+# Held (created exclusively) while a process converts, so only one conversion runs
+# at a time; a file older than BUILD_LOCK_STALE_SECONDS is left over from a crash.
+BUILD_LOCK_FILE = os.path.join(SNAPSHOT_FOLDER, "build.lock")
+BUILD_LOCK_STALE_SECONDS = 1800
+BUILD_LOCK_POLL_SECONDS = 0.5
+# Bump when the snapshot layout changes so existing snapshots are rebuilt
+SNAPSHOT_FORMAT = 5
+
+# Session key -> Excel tab name
+SHEETS = {
+    "df_eis": "EIS_Data",
+    "df_eis_extra": "EIS_Extra",
+    "df_rev": "Revenue_Data",
+    "df_admin": "Admin_Data",
+    "df_audit": "Audit_Data",
+    "df_legal": "Legal_Data",
+    "df_hospital": "Hospital_Data",
+    "df_finance": "Finance_Data",
+    "df_treasury": "Treasury_Data",
+    "df_welfare": "Welfare_Data",
+    "df_dorm": "Dorm_Data",
+    "df_procure": "Procure_Data",
+    "df_strategy": "Strategy_Data",
+}
+
+# --- PROCESS-WIDE CACHE ---
+# One parsed copy of the workbook per process, shared by every browser session.
+# Entries are keyed by the workbook version, so a new upload is picked up on the next read.
+_CACHE = {}
+_LOCK = threading.Lock()
+# Bumped by clear_cache(): sessions still holding the dropped frames reload them
+_CACHE_GENERATION = {"count": 0}
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def get_data_version():
+    """Returns a version string for the saved workbook (None if there is no file)."""
+    return _file_version(DATA_FILE)
+
+def get_data_modified():
+    """Returns the saved workbook's modification time (epoch seconds, None if there is no file)."""
+    try:
+        return os.stat(DATA_FILE).st_mtime
+    except OSError:
+        return None
+
+# --- SNAPSHOT (XLSX -> ARROW) ---
+# Rows are streamed from openpyxl's read-only mode and written to the Arrow file in
+# chunks, so peak memory depends on INGEST_CHUNK_ROWS, not on the size of the sheet.
+INGEST_CHUNK_ROWS = 5000
+
+# Column kinds, and the Arrow type each one is stored as
+_ARROW_TYPES = {
+    "null": pa.null(),
+    "bool": pa.bool_(),
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "datetime": pa.timestamp("us"),
+    "string": pa.string(),
+}
+
+def _cell_kind(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return "datetime"
+    return "string"
+
+def _merge_kinds(a, b):
+    """Widest kind that holds both (e.g. int + float -> float, anything mixed -> string)."""
+    if a == b or b == "null":
+        return a
+    if a == "null":
+        return b
+    if {a, b} == {"int", "float"}:
+        return "float"
+    return "string"
+
+def _to_arrow(values, kind):
+    if kind == "string":
+        values = [None if v is None else str(v) for v in values]
+    elif kind == "datetime":
+        values = [v if v is None or isinstance(v, datetime.datetime) else datetime.datetime.combine(v, datetime.time()) for v in values]
+    return pa.array(values, type=_ARROW_TYPES[kind])
+
+def _header_names(header_row):
+    """Column names the way pandas builds them (blank -> 'Unnamed: i', duplicates -> 'X.1')."""
+    names, seen = [], {}
+    for i, value in enumerate(header_row):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _widen_written(path, schema):
+    """Re-types the rows already written for this sheet (rare: a later chunk needed a wider type)."""
+    written = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    columns = []
+    for field, column in zip(schema, written.columns):
+        if column.type == field.type:
+            columns.append(column)
+        elif field.type == pa.string() and column.type != pa.null():
+            # Same text as str() gives for cells in later chunks
+            columns.append(pa.array([None if v is None else str(v) for v in column.to_pylist()], type=pa.string()))
+        else:
+            columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def _parse_number(text):
+    """'6' -> 6, '1,234.5' -> 1234.5; None for text that is not a number (e.g. '-', 'N/A')."""
+    text = text.strip().replace(",", "")
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return None if number != number else number
+
+def _coerce_written(path, columns):
+    """Turns mostly-numeric columns that were stored as text back into numbers.
+
+    Cells that are not numbers become null. Returns {column: number of cells blanked}.
+    """
+    written = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    blanked = {}
+    for name in columns:
+        values = [None if v is None else _parse_number(v) for v in written.column(name).to_pylist()]
+        blanked[name] = values.count(None) - written.column(name).null_count
+        kind = "float" if any(isinstance(v, float) for v in values) else "int"
+        index = written.schema.get_field_index(name)
+        written = written.set_column(index, pa.field(name, _ARROW_TYPES[kind]), _to_arrow(values, kind))
+    tmp_file = path + ".coercing"
+    with pa.ipc.new_file(tmp_file, written.schema) as writer:
+        for start in range(0, written.num_rows, INGEST_CHUNK_ROWS):
+            writer.write_table(written.slice(start, INGEST_CHUNK_ROWS))
+    del written
+    os.replace(tmp_file, path)
+    return blanked
+
+def _period_arrays(names, columns):
+    """YearNum / MonthNum / SortKey for one chunk, computed once here instead of in every view."""
+    if "Year" not in names:
+        return []
+    years = [year_num(v) for v in columns[names.index("Year")]]
+    if "Month" not in names:
+        return [pa.array(years, type=pa.int64())]
+    months = [month_num(v) for v in columns[names.index("Month")]]
+    keys = [y * 100 + m for y, m in zip(years, months)]
+    return [pa.array(years, type=pa.int64()), pa.array(months, type=pa.int64()), pa.array(keys, type=pa.int64())]
+
+def _sort_written(path):
+    """Rewrites a sheet in SortKey order (stable), copying INGEST_CHUNK_ROWS rows at a time."""
+    written = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    order = pc.sort_indices(written, sort_keys=[("SortKey", "ascending")])
+    tmp_file = path + ".sorting"
+    with pa.ipc.new_file(tmp_file, written.schema) as writer:
+        for start in range(0, len(order), INGEST_CHUNK_ROWS):
+            writer.write_table(written.take(order[start:start + INGEST_CHUNK_ROWS]))
+    del written
+    os.replace(tmp_file, path)
+
+def _stream_sheet_to_arrow(ws, path):
+    """Streams one worksheet into an Arrow IPC (Feather v2) file, chunk by chunk.
+
+    Sheets with a SortKey are stored sorted by period (ties keep their sheet order),
+    so views can cut a month range with a binary search; see periods.slice_period().
+    Returns {column: cells blanked} for number columns that had a few text cells.
+    """
+    ws.reset_dimensions()  # some writers store a wrong sheet size; read until the real end
+    rows = ws.iter_rows(values_only=True)
+
+    header = None
+    for header_row in rows:
+        if any(v is not None for v in header_row):
+            header = _header_names(header_row)
+            break
+    if header is None:
+        # Empty tab
+        with pa.ipc.new_file(path, pa.schema([])):
+            pass
+        return {}
+
+    width = len(header)
+    # Period columns are always recomputed (e.g. a re-uploaded download that already has them)
+    keep = [i for i, n in enumerate(header) if n not in PERIOD_COLUMNS]
+    names = [header[i] for i in keep]
+    period_names = []
+    if "Year" in names:
+        period_names = PERIOD_COLUMNS if "Month" in names else ["YearNum"]
+
+    def make_schema(kinds):
+        fields = [(n, _ARROW_TYPES[k]) for n, k in zip(names, kinds)]
+        return pa.schema(fields + [(n, pa.int64()) for n in period_names])
+
+    # Force string for Year to avoid comma formatting (e.g. 2,568)
+    kinds = ["string" if n == "Year" else "null" for n in names]
+    cell_counts = [collections.Counter() for _ in names]
+    writer = pa.ipc.new_file(path, make_schema(kinds))
+    rows_written = 0
+    last_key, in_order = -1, True
+
+    def flush(chunk):
+        nonlocal writer, kinds, rows_written, last_key, in_order
+        columns = [list(col) for col in zip(*chunk)]
+        if "Year" in names:
+            # Blank Year -> "nan", the same text the old astype(str) gave, so year pickers still sort
+            year_col = names.index("Year")
+            columns[year_col] = ["nan" if v is None else v for v in columns[year_col]]
+        chunk_kinds = list(kinds)
+        for i, col in enumerate(columns):
+            counts = collections.Counter(map(_cell_kind, col))
+            for kind in counts:
+                chunk_kinds[i] = _merge_kinds(chunk_kinds[i], kind)
+            cell_counts[i].update(counts)
+
+        schema = make_schema(chunk_kinds)
+        if chunk_kinds != kinds:
+            writer.close()
+            if rows_written:
+                widened = _widen_written(path, schema)
+                os.remove(path)
+                writer = pa.ipc.new_file(path, schema)
+                writer.write_table(widened)
+                del widened
+            else:
+                writer = pa.ipc.new_file(path, schema)
+            kinds = chunk_kinds
+
+        arrays = [_to_arrow(col, kind) for col, kind in zip(columns, kinds)]
+        arrays += _period_arrays(names, columns)
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        rows_written += len(chunk)
+
+        if "SortKey" in period_names and in_order:
+            keys = arrays[-1].to_numpy()
+            in_order = bool(keys[0] >= last_key and (np.diff(keys) >= 0).all())
+            last_key = int(keys[-1])
+
+    chunk = []
+    for row in rows:
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        row = tuple(row[i] for i in keep)
+        # Skip blank rows (formatting-only rows at the end of a sheet, spacer rows)
+        if all(v is None for v in row):
+            continue
+        chunk.append(row)
+        if len(chunk) >= INGEST_CHUNK_ROWS:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    writer.close()
+
+    # A number column with a few text cells (e.g. "-", "N/A") stays numeric; the text becomes null
+    mixed = [n for n, kind, counts in zip(names, kinds, cell_counts)
+             if kind == "string" and n != "Year" and not counts["bool"] and not counts["datetime"]
+             and counts["int"] + counts["float"] > counts["string"]]
+    blanked = _coerce_written(path, mixed) if mixed else {}
+
+    # Most sheets are entered month by month and are already in order
+    if not in_order:
+        _sort_written(path)
+    return blanked
+
+def _write_cube(path, cube_path):
+    """Builds the monthly cube of one converted sheet (see utils/cube.py); False if it has no periods."""
+    with pa.OSFile(path, "rb") as source:
+        df = pa.ipc.open_file(source).read_all().to_pandas()
+    cube = build_cube(df)
+    if cube is None:
+        return False
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    with pa.OSFile(cube_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return True
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except:
+        return None
+
+def _write_manifest(manifest):
+    tmp_file = MANIFEST_FILE + f".{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+def _remove_old_snapshots(manifest, previous=None):
+    # The previous snapshot stays until the next build: readers that picked up its
+    # manifest while this one was being built may still be opening its files
+    keep = {os.path.basename(MANIFEST_FILE), os.path.basename(BUILD_LOCK_FILE)}
+    for m in (manifest, previous or {}):
+        keep |= {f for f in m.get("sheets", {}).values() if f}
+        keep |= {f for f in m.get("cubes", {}).values() if f}
+    for f in os.listdir(SNAPSHOT_FOLDER):
+        if f not in keep and not f.endswith(".tmp"):
+            try: os.remove(os.path.join(SNAPSHOT_FOLDER, f))
+            except OSError: pass
+
+def build_snapshot(source=DATA_FILE):
+    """Converts every sheet of a workbook (the saved one by default) into the columnar snapshot.
+
+    The workbook is opened once (read-only, streaming) and every tab is parsed
+    from that single handle. Per-sheet timings are kept in the manifest; see
+    get_ingest_report(), as are number columns whose text cells were blanked.
+    Sheets with periods also get their pre-aggregated cube.
+
+    Files are named by workbook version and the manifest is swapped in last,
+    so readers in other processes always see a complete snapshot. Call it while
+    holding the build lock (see publish_snapshot() and _get_manifest()).
+    """
+    version = _file_version(source)
+    if version is None:
+        return None
+    if not os.path.exists(SNAPSHOT_FOLDER):
+        os.makedirs(SNAPSHOT_FOLDER)
+
+    started = time.perf_counter()
+    manifest = {"source_version": version, "format": SNAPSHOT_FORMAT, "sheets": {}, "cubes": {}, "timings": {}, "blanked": {}}
+    wb = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        manifest["timings"]["(open workbook)"] = round(time.perf_counter() - started, 3)
+        for name in SHEETS.values():
+            if name not in wb.sheetnames:
+                # Tab not present in this workbook
+                manifest["sheets"][name] = None
+                continue
+            sheet_started = time.perf_counter()
+            filename = f"{name}-{version}.arrow"
+            tmp_file = os.path.join(SNAPSHOT_FOLDER, filename + f".{os.getpid()}.tmp")
+            try:
+                blanked = _stream_sheet_to_arrow(wb[name], tmp_file)
+                if blanked:
+                    print(f"{name}: text cells in number columns set to blank {blanked}")
+                    manifest["blanked"][name] = blanked
+                os.replace(tmp_file, os.path.join(SNAPSHOT_FOLDER, filename))
+                manifest["sheets"][name] = filename
+                cube_file = f"{name}-{version}.cube.arrow"
+                cube_tmp = os.path.join(SNAPSHOT_FOLDER, cube_file + f".{os.getpid()}.tmp")
+                try:
+                    if _write_cube(os.path.join(SNAPSHOT_FOLDER, filename), cube_tmp):
+                        os.replace(cube_tmp, os.path.join(SNAPSHOT_FOLDER, cube_file))
+                        manifest["cubes"][name] = cube_file
+                except Exception as e:
+                    # The sheet itself is fine; get_cube() falls back to building it in memory
+                    print(f"Error building cube for {name}: {e}")
+                    if os.path.exists(cube_tmp): os.remove(cube_tmp)
+            except Exception as e:
+                print(f"Error converting {name}: {e}")
+                manifest["sheets"][name] = None
+                if os.path.exists(tmp_file): os.remove(tmp_file)
+            manifest["timings"][name] = round(time.perf_counter() - sheet_started, 3)
+    finally:
+        wb.close()
+
+    manifest["total_seconds"] = round(time.perf_counter() - started, 3)
+    previous = _read_manifest()
+    _write_manifest(manifest)
+    _remove_old_snapshots(manifest, previous)
+    return manifest
+
+def _try_build_lock():
+    """Takes the cross-process build lock; False if another conversion holds it."""
+    if not os.path.exists(SNAPSHOT_FOLDER):
+        os.makedirs(SNAPSHOT_FOLDER, exist_ok=True)
+    try:
+        fd = os.open(BUILD_LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(BUILD_LOCK_FILE) > BUILD_LOCK_STALE_SECONDS:
+                os.remove(BUILD_LOCK_FILE)
+        except OSError:
+            pass
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+def _release_build_lock():
+    try: os.remove(BUILD_LOCK_FILE)
+    except OSError: pass
+
+def publish_snapshot(upload_file=None):
+    """Converts a workbook under the build lock and makes it the saved workbook.
+
+    upload_file (a complete temp file in DATA_FOLDER) is converted first and only
+    then moved over DATA_FILE, so until the new snapshot is ready every reader keeps
+    the previous one and none of them starts a conversion of its own. Without it,
+    the saved workbook is converted again (Force Refresh).
+    """
+    while not _try_build_lock():
+        time.sleep(BUILD_LOCK_POLL_SECONDS)
+    try:
+        # rename keeps mtime and size, so the version doesn't change with the move
+        manifest = build_snapshot(upload_file or DATA_FILE)
+        if upload_file:
+            os.replace(upload_file, DATA_FILE)
+        return manifest
+    finally:
+        _release_build_lock()
+
+def _is_current(manifest):
+    return bool(manifest) and manifest.get("source_version") == get_data_version() and manifest.get("format") == SNAPSHOT_FORMAT
+
+def _get_manifest():
+    """Returns the newest complete snapshot manifest, converting the xlsx if nobody has yet.
+
+    While another session or process holds the build lock, the last complete
+    manifest is returned (it can be one version behind) instead of converting again.
+    """
+    manifest = _read_manifest()
+    while not _is_current(manifest):
+        if _try_build_lock():
+            try:
+                # Finished by someone else between our read and the lock?
+                manifest = _read_manifest()
+                return manifest if _is_current(manifest) else build_snapshot()
+            finally:
+                _release_build_lock()
+        if manifest and manifest.get("format") == SNAPSHOT_FORMAT:
+            return manifest
+        # No usable snapshot at all yet: wait for the one being built
+        time.sleep(BUILD_LOCK_POLL_SECONDS)
+        manifest = _read_manifest()
+    return manifest
+
+def _read_snapshot_sheet(manifest, name):
+    """Opens one sheet memory-mapped; returns (DataFrame, mapped buffer or None).
+
+    Numeric columns without blanks point straight into the mapped file, so every
+    process reading the same snapshot (Streamlit, api.py) shares those pages
+    through the OS page cache instead of holding its own copy.
+    """
+    filename = manifest["sheets"].get(name)
+    if not filename:
+        return pd.DataFrame(), None
+    try:
+        source = pa.memory_map(os.path.join(SNAPSHOT_FOLDER, filename), "r")
+        mapped = source.read_buffer()
+        table = pa.ipc.open_file(mapped).read_all()
+        # split_blocks avoids consolidating columns into new 2D blocks (which would copy them)
+        df = table.to_pandas(split_blocks=True)
+        if "MonthNum" in df.columns and pd.api.types.is_string_dtype(df["Month"]):
+            # Thai month as an ordered categorical (calendar order); unknown spellings are kept
+            extra = sorted(set(df["Month"].dropna().astype(str)) - set(THAI_MONTHS))
+            df["Month"] = pd.Categorical(df["Month"], categories=THAI_MONTHS + extra, ordered=True)
+        return df, mapped
+    except:
+        return pd.DataFrame(), None
+
+def get_ingest_report():
+    """Returns the per-sheet parse times (seconds) of the last snapshot build,
+    and which number columns had text cells (e.g. "-") stored as blank."""
+    manifest = _read_manifest()
+    if not manifest or "timings" not in manifest:
+        return pd.DataFrame(columns=["Sheet", "Seconds", "Blanked Text Cells"])
+    report = pd.DataFrame(list(manifest["timings"].items()), columns=["Sheet", "Seconds"])
+    blanked = manifest.get("blanked", {})
+    report["Blanked Text Cells"] = [", ".join(f"{c}: {n}" for c, n in blanked.get(s, {}).items()) for s in report["Sheet"]]
+    total = pd.DataFrame([{"Sheet": "รวม (Total)", "Seconds": manifest.get("total_seconds", report["Seconds"].sum()), "Blanked Text Cells": ""}])
+    return pd.concat([report, total], ignore_index=True)
+
+# --- READERS ---
+def get_datasets():
+    """Returns {session_key: DataFrame} for the current workbook.
+
+    The frames are shared between sessions and must be treated as read-only
+    (call .copy() before adding columns).
+    """
+    version = get_data_version()
+    if version is None:
+        return None
+
+    entry = _CACHE.get("datasets")
+    if entry and entry["version"] == version:
+        return entry["frames"]
+
+    # Any conversion happens here, outside _LOCK, so other sessions keep reading
+    manifest = _get_manifest()
+    if manifest is None:
+        return None
+    loaded = manifest["source_version"]
+
+    with _LOCK:
+        # Another session may have finished loading while we waited
+        entry = _CACHE.get("datasets")
+        if entry and entry["version"] == loaded:
+            return entry["frames"]
+
+        frames, maps = {}, {}
+        for key, name in SHEETS.items():
+            frames[key], maps[key] = _read_snapshot_sheet(manifest, name)
+        _CACHE["datasets"] = {"version": loaded, "frames": frames, "maps": maps, "manifest": manifest, "indexes": {}, "cubes": {}}
+        return frames
+
+def get_loaded_version():
+    """Workbook version of the frames get_datasets() serves; one behind get_data_version() while a conversion runs."""
+    entry = _CACHE.get("datasets")
+    return entry["version"] if entry else None
+
+def get_sheet(sheet_name):
+    """Returns one sheet by its Excel tab name (None if the tab doesn't exist)."""
+    datasets = get_datasets()
+    if datasets is None:
+        return None
+    manifest = _CACHE["datasets"]["manifest"]
+    if not manifest["sheets"].get(sheet_name):
+        return None
+    key = next(k for k, v in SHEETS.items() if v == sheet_name)
+    return datasets[key]
+
+def get_lookup(df, columns=LOOKUP_COLUMNS):
+    """Returns the (Category, Item) lookup index for one of the shared frames.
+
+    Built on first use and kept until the workbook changes; a frame that isn't
+    one of the shared datasets (e.g. a filtered copy) gets an uncached index.
+    """
+    entry = _CACHE.get("datasets")
+    key = next((k for k, frame in entry["frames"].items() if frame is df), None) if entry else None
+    if key is None:
+        return build_index(df, columns)
+
+    cache_key = (key, tuple(columns))
+    if cache_key not in entry["indexes"]:
+        entry["indexes"][cache_key] = build_index(df, columns)
+    return entry["indexes"][cache_key]
+
+def _read_cube(manifest, name):
+    filename = manifest.get("cubes", {}).get(name)
+    if not filename:
+        return None
+    try:
+        with pa.OSFile(os.path.join(SNAPSHOT_FOLDER, filename), "rb") as source:
+            return load_cube(pa.ipc.open_file(source).read_all().to_pandas())
+    except:
+        return None
+
+def get_cube(df):
+    """Returns the pre-aggregated monthly cube (utils/cube.py) for one of the shared frames.
+
+    The cube is written at upload time and loaded on first use; for a frame that
+    isn't one of the shared datasets it is built on the spot.
+    """
+    entry = _CACHE.get("datasets")
+    key = next((k for k, frame in entry["frames"].items() if frame is df), None) if entry else None
+    if key is None:
+        return load_cube(build_cube(df))
+
+    if key not in entry["cubes"]:
+        cube = _read_cube(entry["manifest"], SHEETS[key])
+        entry["cubes"][key] = cube if cube is not None else load_cube(build_cube(df))
+    return entry["cubes"][key]
+
+def get_sheet_table(sheet_name):
+    """Returns one sheet as an Arrow table over the memory-mapped snapshot (no copy; None if missing).
+
+    Same rows in the same order as get_sheet(), but Month is stored as plain text.
+    """
+    if get_sheet(sheet_name) is None:
+        return None
+    entry = _CACHE["datasets"]
+    key = next(k for k, v in SHEETS.items() if v == sheet_name)
+    mapped = entry["maps"][key]
+    if mapped is None:
+        return None
+    return pa.ipc.open_file(mapped).read_all()
+
+# --- MEMORY REPORT ---
+def _buffer_addresses(series):
+    """Yields (address, nbytes) for the buffers behind a column (address None = private copy)."""
+    values = series.array
+    if hasattr(values, "__arrow_array__"):
+        chunked = values.__arrow_array__()
+        chunks = chunked.chunks if isinstance(chunked, pa.ChunkedArray) else [chunked]
+        for chunk in chunks:
+            for buf in chunk.buffers():
+                if buf is not None:
+                    yield buf.address, buf.size
+    elif isinstance(series.dtype, np.dtype) and series.dtype != object:
+        arr = np.asarray(values)
+        yield arr.__array_interface__["data"][0], arr.nbytes
+    else:
+        yield None, int(series.memory_usage(deep=True, index=False))
+
+def get_memory_report():
+    """Per sheet: bytes served from the shared memory map vs. bytes held privately by this process."""
+    get_datasets()
+    entry = _CACHE.get("datasets")
+    if not entry:
+        return pd.DataFrame(columns=["Sheet", "Rows", "Mapped_Bytes", "Resident_Bytes", "File_Bytes"])
+
+    rows = []
+    for key, name in SHEETS.items():
+        df = entry["frames"][key]
+        mapped_buf = entry["maps"][key]
+        start = mapped_buf.address if mapped_buf is not None else 0
+        end = start + (mapped_buf.size if mapped_buf is not None else 0)
+
+        mapped, resident = 0, 0
+        for col in df.columns:
+            for address, nbytes in _buffer_addresses(df[col]):
+                if address is not None and start <= address < end:
+                    mapped += nbytes
+                else:
+                    resident += nbytes
+        rows.append({
+            "Sheet": name,
+            "Rows": len(df),
+            "Mapped_Bytes": mapped,
+            "Resident_Bytes": resident,
+            "File_Bytes": mapped_buf.size if mapped_buf is not None else 0,
+        })
+    return pd.DataFrame(rows)
+
+def clear_cache():
+    """Drops the shared datasets so the next read loads the snapshot again."""
+    with _LOCK:
+        _CACHE.clear()
+        _CACHE_GENERATION["count"] += 1
+
+def get_cache_generation():
+    """Changes every time clear_cache() runs (see data_loader.is_session_stale())."""
+    return _CACHE_GENERATION["count"]
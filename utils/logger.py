@@ -1,12 +1,95 @@
 import pandas as pd
 import datetime
 import os
+import queue
+import sqlite3
+import contextlib
+import collections
+import atexit
+import threading
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
 from streamlit.web.server.websocket_headers import _get_websocket_headers
+from utils.config_manager import load_log_settings
 
-LOG_FILE = "data/system_logs.csv"
+LOG_DB = "data/system_logs.db"
+LOG_FILE = "data/system_logs.csv" # Older CSV log, imported into LOG_DB once
+LOG_COLUMNS = ["Timestamp", "User", "IP Address", "Action", "Details"]
 BANGKOK_TZ = datetime.timezone(datetime.timedelta(hours=7))
 
+# --- LOG STORE ---
+# Events live in a SQLite table indexed by time, user and action, so the Logs tab
+# reads one page and the Analytics tab gets counts from GROUP BY queries instead of
+# loading the whole history. WAL lets the admin pages read while the writer inserts.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    user TEXT,
+    ip TEXT,
+    action TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts);
+CREATE INDEX IF NOT EXISTS idx_logs_user ON logs (user, ts);
+CREATE INDEX IF NOT EXISTS idx_logs_action ON logs (action, ts);
+CREATE TABLE IF NOT EXISTS view_rollups (
+    grain TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    views INTEGER NOT NULL,
+    PRIMARY KEY (grain, bucket, dimension, value)
+) WITHOUT ROWID;
+"""
+# Same order as LOG_COLUMNS
+_DB_COLUMNS = ["ts", "user", "ip", "action", "details"]
+_INSERT = "INSERT INTO logs (ts, user, ip, action, details) VALUES (?, ?, ?, ?, ?)"
+_STORE = {"ready": False}
+_STORE_LOCK = threading.Lock()
+
+# --- ARCHIVE ---
+# Months older than the hot window (load_log_settings()["hot_months"]) are moved out
+# of LOG_DB into one zstd Parquet file per month. Archive months are deleted only once
+# an admin sets retention_months (None = keep everything). The database is always the
+# newest months, so queries read it first and open only the archive months in range.
+LOG_ARCHIVE_FOLDER = "data/log_archive"
+LOG_COMPACT_SECONDS = 3600
+_ARCHIVE_SCHEMA = pa.schema([("id", pa.int64())] + [(c, pa.string()) for c in _DB_COLUMNS])
+_COMPACTED = {"at": None}
+
+# --- USAGE ROLLUPS ---
+# "View Dashboard" events are also counted per dashboard and per user in hourly
+# ("YYYY-MM-DD HH") and daily ("YYYY-MM-DD") buckets, in the same transaction that
+# inserts them. The Analytics tab sums these few rows instead of scanning the log.
+# Hourly buckets go with the hot months; daily ones are kept for retention_months.
+ROLLUP_ACTION = "View Dashboard"
+ROLLUP_GRAINS = {"hour": 13, "day": 10} # Length of the ts prefix that makes the bucket
+ROLLUP_DIMENSIONS = {"dashboard": 4, "user": 1} # Row field (details / user)
+ROLLUP_VERSION = 1 # PRAGMA user_version once existing logs are rolled up
+_UPSERT_ROLLUP = """
+INSERT INTO view_rollups (grain, bucket, dimension, value, views) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (grain, bucket, dimension, value) DO UPDATE SET views = views + excluded.views
+"""
+
+# --- WRITE QUEUE ---
+# log_action only builds the row and puts it on an in-memory queue, so the page
+# never waits for the disk. A background thread inserts queued rows in batches
+# every LOG_FLUSH_SECONDS (sooner once LOG_BATCH_SIZE rows are waiting). If the
+# queue is full, new events are dropped and counted, and the count is logged as a
+# "Logs Dropped" row on the next write.
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_SECONDS = 1.0
+_LOG_QUEUE = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_WAKE = threading.Event()
+_WRITER = {"thread": None}
+_WRITER_LOCK = threading.Lock()
+_DROPPED = {"count": 0}
+_DROPPED_LOCK = threading.Lock()
+
 def get_remote_ip():
     """Attempts to get the client IP address from headers."""
     try:
@@ -21,8 +104,203 @@ def get_remote_ip():
         pass
     return "Unknown"
 
+def migrate_csv_log(conn):
+    """One-time import of the old CSV log into LOG_DB; the CSV is kept as system_logs.csv.migrated."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-checked inside the write lock so only one process imports it
+        if os.path.exists(LOG_FILE):
+            if os.path.getsize(LOG_FILE) > 0:
+                df = pd.read_csv(LOG_FILE, dtype=str, keep_default_na=False)
+                # Schema Check: old logs don't have "IP Address"
+                if "IP Address" not in df.columns:
+                    df["IP Address"] = "N/A"
+                for c in LOG_COLUMNS:
+                    if c not in df.columns:
+                        df[c] = ""
+                conn.executemany(_INSERT, df[LOG_COLUMNS].itertuples(index=False, name=None))
+            os.replace(LOG_FILE, LOG_FILE + ".migrated")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _connect():
+    """Connection to LOG_DB; the first one in a process creates the table and imports the old CSV."""
+    if not os.path.exists("data"):
+        os.makedirs("data")
+    conn = sqlite3.connect(LOG_DB, timeout=30)
+    if not _STORE["ready"]:
+        with _STORE_LOCK:
+            if not _STORE["ready"]:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                migrate_csv_log(conn)
+                backfill_rollups(conn)
+                _STORE["ready"] = True
+    return conn
+
+def _count_views(rows):
+    """Rollup increments for (timestamp, user, ip, action, details) rows."""
+    counts = collections.Counter()
+    for row in rows:
+        if row[3] != ROLLUP_ACTION:
+            continue
+        for grain, length in ROLLUP_GRAINS.items():
+            for dimension, field in ROLLUP_DIMENSIONS.items():
+                counts[(grain, row[0][:length], dimension, row[field] or "")] += 1
+    return counts
+
+def _add_rollups(conn, counts):
+    conn.executemany(_UPSERT_ROLLUP, [key + (n,) for key, n in counts.items()])
+
+def backfill_rollups(conn):
+    """One-time rollup of the views already logged (database and archive)."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= ROLLUP_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-checked inside the write lock so only one process backfills
+        if conn.execute("PRAGMA user_version").fetchone()[0] < ROLLUP_VERSION:
+            conn.execute("DELETE FROM view_rollups")
+            where, args = _where(action=ROLLUP_ACTION)
+            counts = _count_views(conn.execute(f"SELECT {', '.join(_DB_COLUMNS)} FROM logs{where}", args))
+            for month in archive_months():
+                df = _read_archive(month, {"action": ROLLUP_ACTION}, columns=_DB_COLUMNS)
+                counts.update(_count_views(df.itertuples(index=False, name=None)))
+            _add_rollups(conn, counts)
+            conn.execute(f"PRAGMA user_version = {ROLLUP_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _write_rows(rows):
+    """Inserts (timestamp, user, ip, action, details) rows and their rollups in one transaction."""
+    with _DROPPED_LOCK:
+        dropped, _DROPPED["count"] = _DROPPED["count"], 0
+    if dropped:
+        timestamp = datetime.datetime.now(BANGKOK_TZ).strftime("%Y-%m-%d %H:%M:%S")
+        rows = rows + [(timestamp, "System", "-", "Logs Dropped", f"{dropped} events (log queue full)")]
+    if not rows:
+        return
+    with contextlib.closing(_connect()) as conn, conn:
+        conn.executemany(_INSERT, rows)
+        _add_rollups(conn, _count_views(rows))
+
+def _month(months_back=0):
+    """"YYYY-MM" of the month months_back before the current one (Bangkok time)."""
+    now = datetime.datetime.now(BANGKOK_TZ)
+    index = now.year * 12 + now.month - 1 - months_back
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def _archive_path(month):
+    return os.path.join(LOG_ARCHIVE_FOLDER, f"logs-{month}.parquet")
+
+def archive_months():
+    """Archived months ("YYYY-MM"), newest first."""
+    if not os.path.exists(LOG_ARCHIVE_FOLDER):
+        return []
+    names = [f[len("logs-"):-len(".parquet")] for f in os.listdir(LOG_ARCHIVE_FOLDER)
+             if f.startswith("logs-") and f.endswith(".parquet")]
+    return sorted(names, reverse=True)
+
+def _write_archive(month, df):
+    """Adds rows to a month's archive file (temp file + replace; rows already there are skipped)."""
+    path = _archive_path(month)
+    if os.path.exists(path):
+        df = pd.concat([pq.read_table(path).to_pandas(), df], ignore_index=True)
+        # A compaction interrupted before its DELETE leaves rows in both places
+        df = df.drop_duplicates(subset=["id", "ts"])
+    table = pa.Table.from_pandas(df.sort_values(["ts", "id"]), schema=_ARCHIVE_SCHEMA, preserve_index=False)
+    tmp_file = path + ".tmp"
+    pq.write_table(table, tmp_file, compression="zstd")
+    os.replace(tmp_file, path)
+
+def compact_logs():
+    """Moves months before the hot window into the archive and drops archive months past retention.
+
+    Nothing is deleted while retention_months is None (the default).
+    """
+    settings = load_log_settings()
+    hot_months = max(1, int(settings["hot_months"]))
+    retention_months = settings.get("retention_months")
+    if retention_months is not None:
+        retention_months = max(hot_months, int(retention_months))
+    cutoff = _month(hot_months - 1) + "-01"
+
+    with contextlib.closing(_connect()) as conn:
+        # Holds the write lock, so another process can't compact the same rows
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            df = pd.read_sql_query("SELECT id, ts, user, ip, action, details FROM logs WHERE ts < ?", conn, params=[cutoff])
+            if not df.empty:
+                if not os.path.exists(LOG_ARCHIVE_FOLDER):
+                    os.makedirs(LOG_ARCHIVE_FOLDER)
+                for month, part in df.groupby(df["ts"].str.slice(0, 7)):
+                    _write_archive(month, part)
+                conn.execute("DELETE FROM logs WHERE ts < ?", [cutoff])
+            conn.execute("DELETE FROM view_rollups WHERE grain = 'hour' AND bucket < ?", [cutoff])
+            if retention_months is not None:
+                conn.execute("DELETE FROM view_rollups WHERE grain = 'day' AND bucket < ?", [_month(retention_months - 1)])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if retention_months is None:
+        return
+    oldest = _month(retention_months - 1)
+    for month in archive_months():
+        if month < oldest:
+            os.remove(_archive_path(month))
+
+def _drain():
+    """Writes everything queued so far, LOG_BATCH_SIZE rows per transaction."""
+    while True:
+        rows = []
+        try:
+            while len(rows) < LOG_BATCH_SIZE:
+                rows.append(_LOG_QUEUE.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            _write_rows(rows)
+        except Exception as e:
+            print(f"Error writing logs: {e}")
+        for _ in rows:
+            _LOG_QUEUE.task_done()
+        if len(rows) < LOG_BATCH_SIZE:
+            return
+
+def _writer_loop():
+    while True:
+        _WAKE.wait(LOG_FLUSH_SECONDS)
+        _WAKE.clear()
+        _drain()
+        if _COMPACTED["at"] is None or time.monotonic() - _COMPACTED["at"] >= LOG_COMPACT_SECONDS:
+            _COMPACTED["at"] = time.monotonic()
+            try:
+                compact_logs()
+            except Exception as e:
+                print(f"Error compacting logs: {e}")
+
+def _start_writer():
+    with _WRITER_LOCK:
+        if _WRITER["thread"] is None:
+            _WRITER["thread"] = threading.Thread(target=_writer_loop, name="log-writer", daemon=True)
+            _WRITER["thread"].start()
+
+def flush_logs():
+    """Writes queued events now and waits for the writer's current batch."""
+    _drain()
+    _LOG_QUEUE.join()
+
+# Daemon thread stops with the process; whatever is still queued is written first
+atexit.register(flush_logs)
+
 def log_action(user, action, details):
-    """Records an action to the CSV log file with IP and Timestamp."""
+    """Queues an action (with IP and Timestamp) for the log store; returns immediately."""
     now_bangkok = datetime.datetime.now(BANGKOK_TZ)
     timestamp = now_bangkok.strftime("%Y-%m-%d %H:%M:%S")
     
@@ -37,44 +315,149 @@ def log_action(user, action, details):
         "Details": details
     }
     
-    # Ensure directory exists
-    if not os.path.exists("data"):
-        os.makedirs("data")
-        
-    # Load existing or create new
-    if os.path.exists(LOG_FILE):
-        df = pd.read_csv(LOG_FILE)
-        
-        # Schema Check: If old logs don't have "IP Address", add it
-        if "IP Address" not in df.columns:
-            df["IP Address"] = "N/A"
-            
-        df = pd.concat([df, pd.DataFrame([new_entry])], ignore_index=True)
-    else:
-        df = pd.DataFrame([new_entry])
-        
-    df.to_csv(LOG_FILE, index=False)
-
-def get_logs():
-    """Returns the log dataframe sorted by newest first."""
-    if os.path.exists(LOG_FILE):
-        df = pd.read_csv(LOG_FILE)
-        
-        # Ensure 'IP Address' column exists for display safety
-        if "IP Address" not in df.columns:
-            df["IP Address"] = "N/A"
-            
-        # Reorder columns for better readability
-        cols = ["Timestamp", "User", "IP Address", "Action", "Details"]
-        # Only select columns that actually exist (in case of weird file states)
-        existing_cols = [c for c in cols if c in df.columns]
-        df = df[existing_cols]
-        
-        return df.sort_values("Timestamp", ascending=False)
-        
-    return pd.DataFrame(columns=["Timestamp", "User", "IP Address", "Action", "Details"])
+    _start_writer()
+    try:
+        _LOG_QUEUE.put_nowait(tuple(new_entry[c] for c in LOG_COLUMNS))
+    except queue.Full:
+        with _DROPPED_LOCK:
+            _DROPPED["count"] += 1
+        return
+    if _LOG_QUEUE.qsize() >= LOG_BATCH_SIZE:
+        _WAKE.set()
+
+def _where(action=None, user=None, start=None, end=None):
+    clauses, args = [], []
+    if action is not None:
+        clauses.append("action = ?")
+        args.append(action)
+    if user is not None:
+        clauses.append("user = ?")
+        args.append(user)
+    if start is not None:
+        clauses.append("ts >= ?")
+        args.append(start)
+    if end is not None:
+        clauses.append("ts <= ?")
+        args.append(end)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+def _archive_filters(action=None, user=None, start=None, end=None):
+    filters = [("action", "=", action), ("user", "=", user), ("ts", ">=", start), ("ts", "<=", end)]
+    return [f for f in filters if f[2] is not None] or None
+
+def _sources(start=None, end=None):
+    """None (the database) followed by the archive months overlapping start..end, newest first."""
+    months = [m for m in archive_months()
+              if (start is None or m >= start[:7]) and (end is None or m <= end[:7])]
+    return [None] + months
+
+def _read_archive(month, filters, columns=None):
+    return pq.read_table(_archive_path(month), columns=columns, filters=_archive_filters(**filters)).to_pandas()
+
+def get_logs(limit=None, offset=0, action=None, user=None, start=None, end=None):
+    """Returns the log dataframe sorted by newest first.
+
+    limit / offset select one page (all rows when limit is None); action / user and
+    the start / end timestamps ("YYYY-MM-DD HH:MM:SS") filter.
+    """
+    flush_logs()
+    filters = {"action": action, "user": user, "start": start, "end": end}
+    frames = []
+    for month in _sources(start, end):
+        if limit is not None and limit <= 0:
+            break
+        if offset:
+            # Skip whole partitions that lie before the requested page
+            count = _count_source(month, filters)
+            if offset >= count:
+                offset -= count
+                continue
+        if month is None:
+            where, args = _where(**filters)
+            sql = f"SELECT {', '.join(_DB_COLUMNS)} FROM logs{where} ORDER BY ts DESC, id DESC"
+            if limit is not None:
+                sql += " LIMIT ? OFFSET ?"
+                args += [limit, offset]
+            with contextlib.closing(_connect()) as conn:
+                df = pd.DataFrame(conn.execute(sql, args).fetchall(), columns=_DB_COLUMNS)
+        else:
+            df = _read_archive(month, filters).sort_values(["ts", "id"], ascending=False)
+            df = df.iloc[offset:offset + limit if limit is not None else None][_DB_COLUMNS]
+        offset = 0
+        frames.append(df)
+        if limit is not None:
+            limit -= len(df)
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=_DB_COLUMNS)
+    df.columns = LOG_COLUMNS
+    return df
+
+def _count_source(month, filters):
+    if month is None:
+        where, args = _where(**filters)
+        with contextlib.closing(_connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM logs{where}", args).fetchone()[0]
+    if not any(v is not None for v in filters.values()):
+        return pq.ParquetFile(_archive_path(month)).metadata.num_rows
+    return len(_read_archive(month, filters, columns=["ts"]))
+
+def count_logs(action=None, user=None, start=None, end=None):
+    """Number of log rows (matching action / user / time range when given)."""
+    flush_logs()
+    filters = {"action": action, "user": user, "start": start, "end": end}
+    return sum(_count_source(month, filters) for month in _sources(start, end))
+
+def get_log_actions(start=None, end=None):
+    """Distinct Action values, for the Logs tab filter."""
+    flush_logs()
+    actions = set()
+    for month in _sources(start, end):
+        if month is None:
+            where, args = _where(start=start, end=end)
+            with contextlib.closing(_connect()) as conn:
+                actions.update(r[0] for r in conn.execute(f"SELECT DISTINCT action FROM logs{where}", args))
+        else:
+            actions.update(_read_archive(month, {"start": start, "end": end}, columns=["action"])["action"].unique())
+    return sorted(a for a in actions if a is not None)
+
+def _rollup_where(grain, dimension=None, start=None, end=None):
+    clauses, args = ["grain = ?", "dimension = ?"], [grain, dimension or "dashboard"]
+    if start is not None:
+        clauses.append("bucket >= ?")
+        args.append(start)
+    if end is not None:
+        clauses.append("bucket <= ?")
+        args.append(end)
+    return " WHERE " + " AND ".join(clauses), args
+
+def get_view_counts(dimension, grain="day", start=None, end=None):
+    """Dashboard views per "dashboard" or "user" over the buckets start..end, most first.
+
+    start / end are buckets of the grain: "YYYY-MM-DD HH" (hour) or "YYYY-MM-DD" (day).
+    """
+    flush_logs()
+    where, args = _rollup_where(grain, dimension, start, end)
+    sql = f"SELECT value, SUM(views) AS n FROM view_rollups{where} GROUP BY value ORDER BY n DESC, value"
+    with contextlib.closing(_connect()) as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return pd.DataFrame(rows, columns=["Value", "Visits"])
+
+def get_view_timeline(grain="day", start=None, end=None):
+    """Total dashboard views per bucket, oldest first."""
+    flush_logs()
+    where, args = _rollup_where(grain, None, start, end)
+    sql = f"SELECT bucket, SUM(views) FROM view_rollups{where} GROUP BY bucket ORDER BY bucket"
+    with contextlib.closing(_connect()) as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return pd.DataFrame(rows, columns=["Bucket", "Visits"])
 
 def clear_logs():
-    """Clears all logs by removing the file."""
-    if os.path.exists(LOG_FILE):
-        os.remove(LOG_FILE)
+    """Clears all logs: the database, the archive and the imported CSV kept from the migration."""
+    flush_logs()
+    with contextlib.closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM logs")
+        conn.execute("DELETE FROM view_rollups")
+    for month in archive_months():
+        os.remove(_archive_path(month))
+    if os.path.exists(LOG_FILE + ".migrated"):
+        os.remove(LOG_FILE + ".migrated")
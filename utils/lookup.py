@@ -0,0 +1,53 @@
+import numpy as np
+
+# Long-format sheets are looked up by (Category, Item); Strategy_Data adds Year and SubItem.
+LOOKUP_COLUMNS = ("Category", "Item")
+
+def build_index(df, columns=LOOKUP_COLUMNS, period_column="SortKey"):
+    """Maps each key tuple (one value per column) to (row positions, period keys).
+
+    Positions are ascending, so on a period-sorted frame the period keys of a group
+    are sorted too and a month range is two binary searches. Returns None if the
+    frame doesn't have the key columns.
+    """
+    columns = list(columns)
+    if df is None or df.empty or any(c not in df.columns for c in columns):
+        return None
+    if period_column not in df.columns:
+        period_column = None
+
+    periods = df[period_column].to_numpy() if period_column else None
+    groups = {}
+    for key, positions in df.groupby(columns, sort=False, observed=True).indices.items():
+        if not isinstance(key, tuple):
+            key = (key,)
+        positions = np.asarray(positions, dtype=np.int64)
+        groups[key] = (positions, periods[positions] if periods is not None else None)
+    return {"columns": tuple(columns), "period": period_column, "groups": groups}
+
+def lookup_positions(index, key, start_key=None, end_key=None):
+    """Row positions for key, limited to start_key <= period <= end_key when given."""
+    group = index["groups"].get(tuple(key)) if index else None
+    if group is None:
+        return np.empty(0, dtype=np.int64)
+    positions, periods = group
+    if periods is None or (start_key is None and end_key is None):
+        return positions
+    lo = periods.searchsorted(start_key, side='left') if start_key is not None else 0
+    hi = periods.searchsorted(end_key, side='right') if end_key is not None else len(periods)
+    return positions[lo:hi]
+
+def lookup_rows(df, index, key, start_key=None, end_key=None):
+    """Rows matching key (and period range), same as the equivalent boolean mask."""
+    return df.iloc[lookup_positions(index, key, start_key, end_key)]
+
+def lookup_sum(df, index, key, col, start_key=None, end_key=None):
+    """Sum of col over the rows matching key (and period range); 0 when nothing matches."""
+    if col not in df.columns:
+        return 0
+    positions = lookup_positions(index, key, start_key, end_key)
+    values = df[col].to_numpy()
+    if values.dtype.kind in "biuf":
+        # Same result as Series.sum(): NaN skipped, int columns stay int
+        return np.nansum(values[positions])
+    return df[col].iloc[positions].sum()
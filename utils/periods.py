@@ -0,0 +1,35 @@
+THAI_MONTHS = [
+    "มกราคม", "กุมภาพันธ์", "มีนาคม", "เมษายน", "พฤษภาคม", "มิถุนายน",
+    "กรกฎาคม", "สิงหาคม", "กันยายน", "ตุลาคม", "พฤศจิกายน", "ธันวาคม"
+]
+THAI_MONTH_MAP = {m: i + 1 for i, m in enumerate(THAI_MONTHS)}
+
+# Columns the loader adds to every sheet that has Year (and Month).
+# SortKey is YYYYMM in Buddhist years, e.g. 256801 for มกราคม 2568.
+PERIOD_COLUMNS = ["YearNum", "MonthNum", "SortKey"]
+
+def year_num(value):
+    """Year cell -> int (0 if it isn't a number), same as pd.to_numeric(...).fillna(0)."""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+def month_num(value):
+    """Thai month name -> 1..12 (0 if unknown)."""
+    return THAI_MONTH_MAP.get(value, 0) if isinstance(value, str) else 0
+
+def period_key(year, month):
+    """SortKey for a year / Thai month pair selected in the filters."""
+    return (int(year) * 100) + THAI_MONTH_MAP[month]
+
+def slice_period(df, start_key, end_key):
+    """Rows with start_key <= SortKey <= end_key.
+
+    Loader frames are stored sorted by SortKey, so this is two binary searches
+    and a positional slice (a view, not a copy) instead of a boolean mask.
+    """
+    keys = df['SortKey'].to_numpy()
+    lo = keys.searchsorted(start_key, side='left')
+    hi = keys.searchsorted(end_key, side='right')
+    return df.iloc[lo:hi]
@@ -16,7 +16,7 @@ def show_view():
     df = st.session_state['df_admin']
     
     # --- DYNAMIC YEARS ---
-    df['Year'] = df['Year'].astype(str)
+    # Year is already a string (set by the loader); the frame is shared, so don't modify it here
     available_years = sorted(df['Year'].unique(), reverse=True)
     if not available_years: available_years = ["2568"]
 
@@ -106,11 +106,8 @@ def show_view():
     with gc1:
         st.markdown("##### 📉 LINE Official - แนวโน้มการเพิ่มเพื่อน (รายเดือน)")
         
-        df_chart = df[df['Year'] == str(y_end)].copy()
-        
-        month_order = {m: i for i, m in enumerate(months)}
-        df_chart['month_num'] = df_chart['Month'].map(month_order)
-        df_chart = df_chart.sort_values('month_num')
+        # MonthNum is precomputed by the loader
+        df_chart = df[df['Year'] == str(y_end)].sort_values('MonthNum')
         
         if not df_chart.empty:
             fig = px.line(df_chart, x='Month', y='Line_New', markers=True, 
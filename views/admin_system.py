@@ -2,11 +2,23 @@ import streamlit as st
 import pandas as pd
 import os
 import json
+import math
+import datetime
 import plotly.express as px
-from utils.logger import get_logs, log_action, clear_logs
+from utils.logger import get_logs, log_action, clear_logs, count_logs, get_log_actions, compact_logs, archive_months, get_view_counts, get_view_timeline, BANGKOK_TZ
+from utils.config_manager import load_log_settings, save_log_settings
 
 ANNOUNCEMENT_FILE = "data/announcement.json"
 
+# Analytics time ranges: (rollup grain, how many hours / days back)
+ANALYTICS_RANGES = {
+    "24 ชั่วโมงล่าสุด": ("hour", 24),
+    "7 วันล่าสุด": ("day", 7),
+    "30 วันล่าสุด": ("day", 30),
+    "90 วันล่าสุด": ("day", 90),
+    "ทั้งหมด": ("day", None),
+}
+
 def save_announcement(message, type_):
     with open(ANNOUNCEMENT_FILE, "w") as f:
         json.dump({"message": message, "type": type_}, f)
@@ -64,30 +76,72 @@ def show_view():
                 st.success("ล้างประวัติเรียบร้อย!")
                 st.rerun()
 
-        df_logs = get_logs()
-        
-        if not df_logs.empty:
+        with st.expander("⚙️ การเก็บรักษา Logs (Retention)"):
+            settings = load_log_settings()
+            with st.form("log_retention_form"):
+                r1, r2 = st.columns(2)
+                with r1: hot_months = st.number_input("เก็บในฐานข้อมูลหลัก (เดือน)", min_value=1, max_value=24, value=int(settings["hot_months"]))
+                with r2: retention_months = st.number_input("เก็บทั้งหมดรวม Archive (เดือน, 0 = เก็บตลอด ไม่ลบ)", min_value=0, max_value=120, value=int(settings["retention_months"] or 0))
+                if st.form_submit_button("💾 บันทึกและจัดเก็บ Archive ทันที"):
+                    retention_months = max(hot_months, retention_months) if retention_months else None
+                    save_log_settings({"hot_months": hot_months, "retention_months": retention_months})
+                    compact_logs()
+                    log_action(st.session_state.username, "Update Log Retention", f"Hot: {hot_months} months, Keep: {f'{retention_months} months' if retention_months else 'all'}")
+                    st.success("บันทึกเรียบร้อย!")
+                    st.rerun()
+            months = archive_months()
+            st.caption(f"Archive (Parquet): {len(months)} เดือน" + (f" ({months[-1]} ถึง {months[0]})" if months else "")
+                       + (" | ข้อมูลที่เก่ากว่าช่วงเก็บรักษาจะถูกลบอัตโนมัติ" if settings["retention_months"] else " | เก็บทุกเดือน (ยังไม่ได้ตั้งช่วงเก็บรักษา)"))
+
+        # Only the selected page is read, and only the archive months the date range reaches
+        today = datetime.datetime.now(BANGKOK_TZ).date()
+        f0, f1, f2, f3 = st.columns([2, 2, 1, 1])
+        with f0: dates = st.date_input("ช่วงวันที่", value=(today - datetime.timedelta(days=30), today))
+        start = f"{dates[0]} 00:00:00" if len(dates) > 0 else None
+        end = f"{dates[1]} 23:59:59" if len(dates) > 1 else None
+        with f1: action_filter = st.selectbox("ประเภทกิจกรรม", ["ทั้งหมด"] + get_log_actions(start, end))
+        action = None if action_filter == "ทั้งหมด" else action_filter
+        total = count_logs(action=action, start=start, end=end)
+        with f2: page_size = st.selectbox("แถวต่อหน้า", [50, 100, 500], index=1)
+        pages = max(1, math.ceil(total / page_size))
+        with f3: page = st.number_input(f"หน้า (จาก {pages})", min_value=1, max_value=pages, value=1, step=1)
+
+        if total:
+            df_logs = get_logs(limit=page_size, offset=(page - 1) * page_size, action=action, start=start, end=end)
             st.dataframe(df_logs, use_container_width=True, hide_index=True)
-            csv = df_logs.to_csv(index=False).encode('utf-8-sig')
-            st.download_button("📥 ดาวน์โหลด Logs (.csv)", csv, "system_logs.csv", "text/csv")
+            st.caption(f"ทั้งหมด {total:,} รายการ")
+            # Full export only on request, not on every rerun
+            if st.button("📦 เตรียมไฟล์ Logs (.csv)"):
+                csv = get_logs(action=action, start=start, end=end).to_csv(index=False).encode('utf-8-sig')
+                st.download_button("📥 ดาวน์โหลด Logs (.csv)", csv, "system_logs.csv", "text/csv")
         else:
-            st.info("ยังไม่มีประวัติการใช้งาน")
+            st.info("ไม่มีประวัติการใช้งานในช่วงที่เลือก")
 
     # --- TAB 3: ANALYTICS ---
     with tab3:
         st.subheader("📈 สถิติการเข้าใช้งาน (Usage Analytics)")
-        df_logs = get_logs()
+        range_label = st.radio("ช่วงเวลา", list(ANALYTICS_RANGES), index=len(ANALYTICS_RANGES) - 1, horizontal=True)
+        grain, span = ANALYTICS_RANGES[range_label]
+        now = datetime.datetime.now(BANGKOK_TZ)
+        if grain == "hour":
+            start = (now - datetime.timedelta(hours=span - 1)).strftime("%Y-%m-%d %H")
+            start_ts = start + ":00:00"
+        elif span:
+            start = (now.date() - datetime.timedelta(days=span - 1)).isoformat()
+            start_ts = start + " 00:00:00"
+        else:
+            start = start_ts = None
 
-        if not df_logs.empty:
-            df_views = df_logs[df_logs['Action'] == 'View Dashboard']
+        # Counts come from the hourly / daily rollups kept up to date by log_action
+        if not get_logs(limit=1).empty:
+            top_dash = get_view_counts("dashboard", grain, start)
 
-            if not df_views.empty:
+            if not top_dash.empty:
                 col_a, col_b = st.columns(2)
 
                 # Chart 1: Most Visited Dashboards
                 with col_a:
                     st.markdown("##### 🏆 หน้าจอที่ถูกใช้งานสูงสุด")
-                    top_dash = df_views['Details'].value_counts().reset_index()
                     top_dash.columns = ['Dashboard', 'Visits']
                     
                     fig_dash = px.bar(top_dash, x='Visits', y='Dashboard', orientation='h', text='Visits',
@@ -98,7 +152,7 @@ def show_view():
                 # Chart 2: Most Active Users
                 with col_b:
                     st.markdown("##### 👤 ผู้ใช้งานที่มีกิจกรรมสูงสุด")
-                    top_users = df_views['User'].value_counts().reset_index()
+                    top_users = get_view_counts("user", grain, start)
                     top_users.columns = ['User', 'Visits']
                     
                     fig_users = px.bar(top_users, x='User', y='Visits', text='Visits',
@@ -106,11 +160,19 @@ def show_view():
                     fig_users.update_layout(height=350)
                     st.plotly_chart(fig_users, use_container_width=True)
                 
+                # Chart 3: Visits over time
+                st.markdown("##### 📅 แนวโน้มการเข้าชม (" + ("รายชั่วโมง" if grain == "hour" else "รายวัน") + ")")
+                timeline = get_view_timeline(grain, start)
+                fig_time = px.line(timeline, x='Bucket', y='Visits', markers=True)
+                fig_time.update_layout(xaxis_title=None, height=300)
+                st.plotly_chart(fig_time, use_container_width=True)
+
                 # Table: Recent Activity
                 st.markdown("##### 🕒 การเข้าใช้งานล่าสุด")
-                st.dataframe(df_views[['Timestamp', 'User', 'Details']].head(10), use_container_width=True, hide_index=True)
+                df_recent = get_logs(limit=10, action='View Dashboard', start=start_ts)
+                st.dataframe(df_recent[['Timestamp', 'User', 'Details']], use_container_width=True, hide_index=True)
 
             else:
-                st.info("ยังไม่มีข้อมูลการเข้าชม Dashboard (No view data recorded yet)")
+                st.info("ยังไม่มีข้อมูลการเข้าชม Dashboard ในช่วงที่เลือก (No view data recorded yet)")
         else:
             st.info("ยังไม่มีข้อมูลในระบบ Log")
@@ -3,10 +3,16 @@ import json
 import os
 import uuid
 import datetime
+import pandas as pd
 from utils.styles import render_header
+from utils.api_usage import load_usage, delete_usage
 
 KEYS_FILE = "api_keys.json"
 
+# Token bucket defaults for new keys (requests/second, burst); edit per key in api_keys.json
+DEFAULT_RATE_LIMIT = 5.0
+DEFAULT_BURST = 20
+
 def load_keys():
     if not os.path.exists(KEYS_FILE):
         return {}
@@ -14,8 +20,12 @@ def load_keys():
         return json.load(f)
 
 def save_keys(keys):
-    with open(KEYS_FILE, "w") as f:
+    # Write a temp file and swap it in: api.py never reads a half-written file,
+    # and the new inode / mtime tells it to reload its key set
+    tmp_file = KEYS_FILE + f".{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
         json.dump(keys, f, indent=4)
+    os.replace(tmp_file, KEYS_FILE)
 
 def generate_new_key(name):
     keys = load_keys()
@@ -23,7 +33,9 @@ def generate_new_key(name):
     keys[new_api_key] = {
         "name": name,
         "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "status": "active"
+        "status": "active",
+        "rate_limit": DEFAULT_RATE_LIMIT,
+        "burst": DEFAULT_BURST
     }
     save_keys(keys)
     return new_api_key
@@ -33,6 +45,7 @@ def revoke_key(api_key):
     if api_key in keys:
         del keys[api_key]
         save_keys(keys)
+        delete_usage(api_key)
 
 def show_view():
     render_header("🔌 API Management (จัดการการเชื่อมต่อ)", border_color="#607D8B")
@@ -82,14 +95,42 @@ def show_view():
                 st.rerun()
 
     st.write("---")
+
+    # --- SECTION 3: USAGE & RATE LIMITS ---
+    st.subheader("📈 การใช้งาน API (Usage)")
+    if keys:
+        usage = load_usage(keys)
+        rows = []
+        for k, v in keys.items():
+            u = usage.get(k, {})
+            rows.append({
+                "System Name": v['name'],
+                "API Key": k,
+                "Requests": u.get("requests", 0),
+                "Data Sent (MB)": round(u.get("bytes", 0) / (1024 * 1024), 2),
+                "Throttled (429)": u.get("throttled", 0),
+                "Rate Limit (req/s)": v.get("rate_limit", DEFAULT_RATE_LIMIT),
+                "Burst": v.get("burst", DEFAULT_BURST),
+                "Last Seen": u.get("last_seen") or "-",
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.caption("💡 ตัวเลขอัปเดตทุก ~5 วินาทีจาก API server | ปรับ rate_limit / burst ของแต่ละ Key ได้ในไฟล์ api_keys.json (0 = ไม่จำกัด)")
+    else:
+        st.caption("No active API keys.")
+
+    st.write("---")
     
-    # --- SECTION 3: API DOCS ---
+    # --- SECTION 4: API DOCS ---
     st.subheader("📘 วิธีการใช้งาน (Documentation)")
     st.markdown("""
     **Endpoint Base URL:** `http://YOUR-SERVER-IP:8000`
     
     **Header Required:**
     - `X-API-KEY`: *<Your-Generated-Key>*
+
+    **Batch:** ดึงหลายชุดข้อมูลในครั้งเดียวด้วย `/api/v1/batch?datasets=eis,finance,treasury` (ได้ผลเป็น `{"eis": {"data": [...]}, ...}` รองรับ `fields`, `from`, `to`, `category`, `item`, `limit` เหมือน endpoint ปกติ)
+
+    **Rate Limit:** เกินโควตาของ Key จะได้รับ `429 Too Many Requests` พร้อม Header `Retry-After` (วินาที)
     
     **Example Python Code:**
     """)
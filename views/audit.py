@@ -14,8 +14,7 @@ def show_view():
     df = st.session_state['df_audit']
 
     # --- DYNAMIC YEAR FILTER ---
-    # Convert column to string just in case, then find unique values
-    df['Year'] = df['Year'].astype(str)
+    # Year is already a string (set by the loader); the frame is shared, so don't modify it here
     available_years = sorted(df['Year'].unique(), reverse=True)
     
     # If no years found, default to empty list to prevent crash
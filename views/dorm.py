@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, year_num, slice_period
 
 def show_view():
     render_header("🏢 หอพัก สกสค. (OTEP Dormitory)", border_color="#8BC34A")
@@ -11,21 +11,11 @@ def show_view():
         st.error("⚠️ ไม่พบข้อมูล Dorm_Data ใน Excel")
         return
 
-    df = st.session_state['df_dorm'].copy()
+    df = st.session_state['df_dorm']
 
     # --- FILTER LOGIC ---
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-    
-    df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-    df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-    # Sort for charts
-    df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
-
     available_years = sorted(df['Year'].unique(), reverse=True)
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     # Create Filter UI
     # Note: Image shows "Date: 08/12/2568" and "Room Type". 
@@ -43,11 +33,12 @@ def show_view():
             st.rerun()
 
     # Filter Data
-    # 1. Snapshot Data (for Top Cards & Donut Charts)
-    snapshot_data = df[(df['Year'] == str(sel_year)) & (df['Month'] == sel_month)]
-    
-    # 2. Trend Data (for Bottom Charts - Whole Year)
-    trend_data = df[df['Year'] == str(sel_year)].sort_values('SortKey')
+    # 1. Trend Data (for Bottom Charts - Whole Year), already in month order
+    year_key = year_num(sel_year) * 100
+    trend_data = slice_period(df, year_key, year_key + 12)
+
+    # 2. Snapshot Data (for Top Cards & Donut Charts)
+    snapshot_data = trend_data[trend_data['Month'] == sel_month]
 
     if snapshot_data.empty:
         st.warning(f"ไม่พบข้อมูลสำหรับ {sel_month} {sel_year}")
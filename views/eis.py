@@ -3,6 +3,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, THAI_MONTH_MAP, period_key, slice_period
+from utils.dataset_store import get_cube
+from utils.cube import cube_sum
 
 def show_view():
     render_header("สำนัก ช.พ.ค. - ช.พ.ส", border_color="#00BCD4")
@@ -23,7 +26,7 @@ def show_view():
         st.caption("💡 คำแนะนำ: ตรวจสอบว่าไฟล์ Excel มี Tab ชื่อ 'EIS_Extra' และอัปเดตไฟล์ utils/data_loader.py แล้ว")
 
     # --- 1. PREPARE MAIN DATA (MEMBERS) ---
-    df = st.session_state['df_eis'].copy()
+    df = st.session_state['df_eis']
 
     # Verify Columns
     required_cols = ['Year', 'Month', 'Category', 'Item', 'Value']
@@ -32,26 +35,11 @@ def show_view():
         st.error(f"❌ Error: ข้อมูลใน Tab 'EIS_Data' ไม่ถูกต้อง (ขาดคอลัมน์: {missing_cols})")
         return
 
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-    
-    # Generate SortKey safely
-    try:
-        if 'SortKey' not in df.columns:
-            df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-            df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-            df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
-    except Exception as e:
-        st.error(f"❌ Error Processing Dates: {e}")
-        return
-
     # --- FILTER SETUP ---
     target_years = ["2568", "2567", "2566"]
     actual_years = [str(y) for y in df['Year'].unique()]
     available_years = sorted(list(set(target_years + actual_years)), reverse=True)
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     # --- FILTER UI ---
     st.markdown("##### 🔎 ตัวเลือกการกรอง (Filter)")
@@ -69,10 +57,9 @@ def show_view():
 
     # Apply Filter
     try:
-        start_key = (int(y_start) * 100) + thai_month_map[m_start]
-        end_key = (int(y_end) * 100) + thai_month_map[m_end]
-        mask = (df['SortKey'] >= start_key) & (df['SortKey'] <= end_key)
-        df_filtered = df[mask]
+        start_key = period_key(y_start, m_start)
+        end_key = period_key(y_end, m_end)
+        df_filtered = slice_period(df, start_key, end_key)
     except:
         st.error("❌ Error applying filter")
         return
@@ -82,15 +69,16 @@ def show_view():
         return
 
     # --- CALCULATION LOGIC ---
+    eis_cube = get_cube(df)
+
     def get_sum(cat, item):
-        val = df_filtered[(df_filtered['Category'] == cat) & (df_filtered['Item'] == item)]['Value'].sum()
+        val = cube_sum(eis_cube, ('Category', 'Item'), (cat, item), 'Value', start_key, end_key)
         return val if pd.notna(val) else 0
 
-    latest_key = df_filtered['SortKey'].max()
-    df_snap = df_filtered[df_filtered['SortKey'] == latest_key]
+    latest_key = df_filtered['SortKey'].iloc[-1]
     
     def get_snap(cat, item):
-        val = df_snap[(df_snap['Category'] == cat) & (df_snap['Item'] == item)]['Value'].sum()
+        val = cube_sum(eis_cube, ('Category', 'Item'), (cat, item), 'Value', latest_key, latest_key)
         return val if pd.notna(val) else 0
 
     # Main Numbers (Safely handled)
@@ -245,22 +233,22 @@ def show_view():
 
     if has_extra_data:
         try:
-            df_ex = st.session_state['df_eis_extra'].copy()
-            df_ex['YearNum'] = pd.to_numeric(df_ex['Year'], errors='coerce').fillna(0).astype(int)
-            df_ex['MonthNum'] = df_ex['Month'].map(thai_month_map).fillna(0).astype(int)
-            df_ex['SortKey'] = (df_ex['YearNum'] * 100) + df_ex['MonthNum']
-            df_ex_filtered = df_ex[(df_ex['SortKey'] >= start_key) & (df_ex['SortKey'] <= end_key)]
+            df_ex = st.session_state['df_eis_extra']
+            ex_cube = get_cube(df_ex)
+
+            def get_extra(cat, item):
+                return cube_sum(ex_cube, ('Category', 'Item'), (cat, item), 'Value', start_key, end_key)
 
             # Death Data
             death_mapping = [('โรคมะเร็ง', 'โรคมะเร็ง'), ('โรคปอด', 'โรคปอด'), ('โรคหัวใจ/หลอดเลือด', 'โรคหัวใจ'), ('ชราภาพ', 'โรคชรา'), ('ติดเชื้อในกระแสเลือด', 'โรคสมอง')]
             for db_key, label in death_mapping:
-                val = df_ex_filtered[(df_ex_filtered['Category'] == 'Death_Cause') & (df_ex_filtered['Item'] == db_key)]['Value'].sum()
+                val = get_extra('Death_Cause', db_key)
                 cpk_death_data[label] = int(val * 0.55)
                 cps_death_data[label] = int(val * 0.45)
                 
             # Financial Data
-            cpk_remit_total = df_ex_filtered[(df_ex_filtered['Category'] == 'Remittance') & (df_ex_filtered['Item'] == 'เงินนำส่ง ช.พ.ค.')]['Value'].sum() * 1000000 
-            cps_remit_total = df_ex_filtered[(df_ex_filtered['Category'] == 'Remittance') & (df_ex_filtered['Item'] == 'เงินนำส่ง ช.พ.ส.')]['Value'].sum() * 1000000
+            cpk_remit_total = get_extra('Remittance', 'เงินนำส่ง ช.พ.ค.') * 1000000 
+            cps_remit_total = get_extra('Remittance', 'เงินนำส่ง ช.พ.ส.') * 1000000
         except Exception as e:
             st.error(f"❌ Error Processing Extra Data: {e}")
 
@@ -331,7 +319,7 @@ def show_view():
         """, unsafe_allow_html=True)
 
     def create_trend_chart(color_hex, title):
-        dates = pd.date_range(start=f"2024-{thai_month_map[m_start]:02d}-01", periods=10, freq='M')
+        dates = pd.date_range(start=f"2024-{THAI_MONTH_MAP[m_start]:02d}-01", periods=10, freq='M')
         months_label = [f"งวด {i+1}" for i in range(len(dates))]
         values = [random.uniform(88, 95) for _ in range(len(dates))]
         
@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, period_key, slice_period
 
 def show_view():
     render_header("โรงพยาบาลครู", border_color="#00897B")
@@ -11,22 +12,12 @@ def show_view():
         st.error("⚠️ ไม่พบข้อมูล Hospital_Data ใน Excel (Please add 'Hospital_Data' tab)")
         return
 
-    df = st.session_state['df_hospital'].copy()
+    df = st.session_state['df_hospital']
 
     # --- 1. RANGE FILTER LOGIC ---
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-    
-    # Create numeric keys for sorting
-    df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-    df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-    df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
-
     available_years = sorted(df['Year'].unique(), reverse=True)
     if not available_years: available_years = ["2568"]
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     # Range Selectors
     c1, c2, c3, c4, c5 = st.columns([1,1,1,1,1])
@@ -41,11 +32,10 @@ def show_view():
             st.rerun()
 
     # Apply Filter
-    start_key = (int(y_start) * 100) + thai_month_map[m_start]
-    end_key = (int(y_end) * 100) + thai_month_map[m_end]
+    start_key = period_key(y_start, m_start)
+    end_key = period_key(y_end, m_end)
     
-    mask = (df['SortKey'] >= start_key) & (df['SortKey'] <= end_key)
-    df_filtered = df[mask]
+    df_filtered = slice_period(df, start_key, end_key)
 
     # --- 2. AGGREGATE DATA ---
     # Sum up columns if data exists
@@ -3,6 +3,9 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, period_key, slice_period
+from utils.dataset_store import get_cube
+from utils.cube import cube_sum, cube_keys
 
 def show_view():
     render_header("⚖️ สำนักนิติการ (Legal Affairs Office)", border_color="#8E24AA")
@@ -12,27 +15,13 @@ def show_view():
         st.error("⚠️ ไม่พบข้อมูล Legal_Data ใน Excel (Please add 'Legal_Data' tab)")
         return
 
-    df = st.session_state['df_legal'].copy()
-    
-    # 2. PREPARE DATA FOR FILTERING
-    # Map Thai months to numbers 1-12
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-    
-    # Create numeric columns for filtering
-    # Ensure Year is numeric
-    df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-    # Map Month name to Month Number
-    df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-    # Create a "SortKey" (e.g., 256801 for Jan 2568) to compare ranges easily
-    df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
+    df = st.session_state['df_legal']
 
+    # 2. PREPARE DATA FOR FILTERING
     # Get lists for dropdowns
     available_years = sorted(df['Year'].unique(), reverse=True)
     if not available_years: available_years = ["2568"]
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     # 3. FILTER UI (Range Selector)
     c1, c2, c3, c4, c5 = st.columns([1,1,1,1,1])
@@ -48,12 +37,11 @@ def show_view():
 
     # 4. APPLY FILTER LOGIC
     # Calculate Start and End Keys based on selection
-    start_key = (int(y_start) * 100) + thai_month_map[m_start]
-    end_key = (int(y_end) * 100) + thai_month_map[m_end]
+    start_key = period_key(y_start, m_start)
+    end_key = period_key(y_end, m_end)
 
-    # Filter the dataframe
-    mask = (df['SortKey'] >= start_key) & (df['SortKey'] <= end_key)
-    df_filtered = df[mask]
+    # Filter the dataframe (binary-search slice on the period-sorted frame)
+    df_filtered = slice_period(df, start_key, end_key)
 
     if df_filtered.empty:
         st.warning(f"ไม่พบข้อมูลในช่วงเวลา: {m_start} {y_start} - {m_end} {y_end}")
@@ -61,11 +49,17 @@ def show_view():
         sums = {'Pending': 0, 'Completed': 0, 'Damages_Million': 0}
         group_data = pd.DataFrame(columns=['Group', 'Pending', 'Completed', 'Total', 'Rate'])
     else:
-        # 5. AGGREGATE DATA (Summing up the filtered rows)
-        sums = df_filtered[['Pending', 'Completed', 'Damages_Million']].sum()
+        # 5. AGGREGATE DATA (monthly running totals built at upload time)
+        cube = get_cube(df)
+        sums = {c: cube_sum(cube, (), (), c, start_key, end_key) for c in ['Pending', 'Completed', 'Damages_Million']}
         
-        # Group by 'Group' (e.g. 'คดี', 'ละเมิด') to sum specific categories for charts
-        group_data = df_filtered.groupby("Group")[['Pending', 'Completed']].sum().reset_index()
+        # Totals per 'Group' (e.g. 'คดี', 'ละเมิด') for the charts, in sorted order like groupby
+        groups = [key[0] for key in cube_keys(cube, ('Group',), start_key, end_key)]
+        group_data = pd.DataFrame({
+            'Group': groups,
+            'Pending': [cube_sum(cube, ('Group',), (g,), 'Pending', start_key, end_key) for g in groups],
+            'Completed': [cube_sum(cube, ('Group',), (g,), 'Completed', start_key, end_key) for g in groups],
+        })
         group_data['Total'] = group_data['Pending'] + group_data['Completed']
         # Calculate Rate (Avoid division by zero)
         group_data['Rate'] = group_data.apply(lambda x: (x['Completed'] / x['Total'] * 100) if x['Total'] > 0 else 0, axis=1)
@@ -1,7 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, period_key, slice_period
+from utils.dataset_store import get_cube
+from utils.cube import cube_sum
 
 def show_view():
     render_header("สำนักการคลัง - กลุ่มการพัสดุและอาคารสถานที่", border_color="#795548")
@@ -11,7 +13,7 @@ def show_view():
         st.warning("⚠️ ไม่พบข้อมูล Procure_Data (กรุณาอัปโหลดไฟล์ Excel)")
         return
 
-    df = st.session_state['df_procure'].copy()
+    df = st.session_state['df_procure']
 
     # --- SAFETY CHECK: Verify Columns Exist ---
     required_cols = ['Year', 'Month', 'Category', 'Item', 'Value']
@@ -24,20 +26,9 @@ def show_view():
     # ------------------------------------------
 
     # 2. FILTER LOGIC
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-
-    # Generate SortKey if missing
-    if 'SortKey' not in df.columns:
-        df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-        df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-        df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
-
     available_years = sorted(df['Year'].unique(), reverse=True)
     if not available_years: available_years = ["2568"]
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     # Filter UI
     st.markdown("##### 🔎 ตัวเลือกการกรอง (Filter)")
@@ -53,26 +44,27 @@ def show_view():
             st.rerun()
 
     # Apply Filter
-    start_key = (int(y_start) * 100) + thai_month_map[m_start]
-    end_key = (int(y_end) * 100) + thai_month_map[m_end]
-    mask = (df['SortKey'] >= start_key) & (df['SortKey'] <= end_key)
-    df_filtered = df[mask]
+    start_key = period_key(y_start, m_start)
+    end_key = period_key(y_end, m_end)
+    df_filtered = slice_period(df, start_key, end_key)
 
     if df_filtered.empty:
         st.warning(f"ไม่พบข้อมูลในช่วงเวลา: {m_start} {y_start} - {m_end} {y_end}")
         return
 
     # --- KPI CARDS ---
+    cube = get_cube(df)
+
     # 1. Procurement Value (Sum of filtered period)
-    procure_val = df_filtered[df_filtered['Category'] == 'Procurement']['Value'].sum()
+    procure_val = cube_sum(cube, ('Category',), ('Procurement',), 'Value', start_key, end_key)
     
     # 2. Budget Remaining (Budget - Procurement)
-    budget_val = df_filtered[df_filtered['Category'] == 'Budget']['Value'].sum()
+    budget_val = cube_sum(cube, ('Category',), ('Budget',), 'Value', start_key, end_key)
     budget_remain = budget_val - procure_val
     
     # 3. Inventory Count (Snapshot of latest month only)
-    latest_key = df_filtered['SortKey'].max()
-    inventory_val = df_filtered[(df_filtered['SortKey'] == latest_key) & (df_filtered['Category'] == 'Inventory')]['Value'].sum()
+    latest_key = df_filtered['SortKey'].iloc[-1]
+    inventory_val = cube_sum(cube, ('Category',), ('Inventory',), 'Value', latest_key, latest_key)
 
     c1, c2, c3 = st.columns(3)
     with c1:
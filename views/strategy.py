@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from utils.styles import render_header
+from utils.dataset_store import get_lookup
+from utils.lookup import lookup_rows, lookup_sum
 
 def show_view():
     render_header("สำนักนโยบาย และยุทธศาสตร์", border_color="#2196F3")
@@ -11,7 +13,8 @@ def show_view():
         st.warning("⚠️ ไม่พบข้อมูล Strategy_Data (กรุณาอัปโหลดไฟล์ Excel)")
         return
 
-    df = st.session_state['df_strategy'].copy()
+    # Shared, read-only frame (only filtered below, never modified)
+    df = st.session_state['df_strategy']
     
     # Check Columns
     required_cols = ['Year', 'Category', 'Item', 'SubItem', 'Value', 'Note']
@@ -50,11 +53,18 @@ def show_view():
         st.warning(f"⚠️ ไม่พบข้อมูลสำหรับปี {selected_year} ในไฟล์ Excel")
         # We don't return here to allow seeing the UI, but graphs will be empty
     
+    # (Year, Category, Item[, SubItem]) indexes, built once per uploaded workbook
+    sub_index = get_lookup(df, ('Year', 'Category', 'Item', 'SubItem'))
+    item_index = get_lookup(df, ('Year', 'Category', 'Item'))
+
+    def get_value(year, cat, item, subitem):
+        return lookup_sum(df, sub_index, (str(year), cat, item, subitem), 'Value')
+
     # Helper to calculate Delta
     def get_delta(cat, item, subitem):
         try:
-            val_curr = df_curr[(df_curr['Category']==cat) & (df_curr['Item']==item) & (df_curr['SubItem']==subitem)]['Value'].sum()
-            val_prev = df_prev[(df_prev['Category']==cat) & (df_prev['Item']==item) & (df_prev['SubItem']==subitem)]['Value'].sum()
+            val_curr = get_value(selected_year, cat, item, subitem)
+            val_prev = get_value(compare_year, cat, item, subitem)
             
             # If previous year is 0, we can't calculate % change properly
             if val_prev == 0: return val_curr, 0.0
@@ -70,7 +80,7 @@ def show_view():
     # 1.1 Revenue Card
     rev_act, rev_delta = get_delta('Overview', 'Revenue_Total', 'Actual')
     # Plan comes from current year
-    rev_plan = df_curr[(df_curr['Category']=='Overview') & (df_curr['Item']=='Revenue_Total') & (df_curr['SubItem']=='Plan')]['Value'].sum()
+    rev_plan = get_value(selected_year, 'Overview', 'Revenue_Total', 'Plan')
     
     with c1:
         st.markdown(f"""
@@ -88,7 +98,7 @@ def show_view():
 
     # 1.2 Expense Card
     exp_act, exp_delta = get_delta('Overview', 'Expense_Total', 'Actual')
-    exp_bud = df_curr[(df_curr['Category']=='Overview') & (df_curr['Item']=='Expense_Total') & (df_curr['SubItem']=='Budget')]['Value'].sum()
+    exp_bud = get_value(selected_year, 'Overview', 'Expense_Total', 'Budget')
 
     with c2:
         st.markdown(f"""
@@ -171,7 +181,7 @@ def show_view():
 
     # Helper for small status cards
     def status_card(col, title, item_name, color):
-        row = df_curr[(df_curr['Category']=='KPI_Sub') & (df_curr['Item']==item_name)]
+        row = lookup_rows(df, item_index, (str(selected_year), 'KPI_Sub', item_name))
         val = row['Value'].sum() if not row.empty else 0
         note = row['Note'].iloc[0] if not row.empty else ""
         col.markdown(f"""
@@ -1,7 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, period_key, slice_period
+from utils.dataset_store import get_cube
+from utils.cube import cube_sum
 
 def show_view():
     render_header("สำนักการคลัง กลุ่มการเงิน ", border_color="#009688")
@@ -10,21 +12,12 @@ def show_view():
         st.error("⚠️ ไม่พบข้อมูล Treasury_Data ใน Excel")
         return
 
-    df = st.session_state['df_treasury'].copy()
+    df = st.session_state['df_treasury']
 
     # --- FILTER LOGIC ---
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-    
-    df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-    df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-    df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
-
     available_years = sorted(df['Year'].unique(), reverse=True)
     if not available_years: available_years = ["2568"]
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     c1, c2, c3, c4, c5 = st.columns([1,1,1,1,1])
     with c1: m_start = st.selectbox("เดือนเริ่มต้น", months_list, index=0)
@@ -37,30 +30,30 @@ def show_view():
         if st.button("🔍 กรองข้อมูล", use_container_width=True):
             st.rerun()
 
-    start_key = (int(y_start) * 100) + thai_month_map[m_start]
-    end_key = (int(y_end) * 100) + thai_month_map[m_end]
+    start_key = period_key(y_start, m_start)
+    end_key = period_key(y_end, m_end)
     
-    mask = (df['SortKey'] >= start_key) & (df['SortKey'] <= end_key)
-    df_filtered = df[mask]
+    df_filtered = slice_period(df, start_key, end_key)
     
     if df_filtered.empty:
         st.warning(f"ไม่พบข้อมูลในช่วงเวลา: {m_start} {y_start} - {m_end} {y_end}")
         return
 
     # --- AGGREGATION LOGIC ---
+    cube = get_cube(df)
+    level = ('Category', 'Item')
+
     # 1. Flow Data (Rev/Exp): SUM over the period
-    flow_mask = df_filtered['Category'] == 'KPI'
-    rev_sum = df_filtered[flow_mask & (df_filtered['Item'] == 'Rev_Month')]['Value_1'].sum()
-    exp_sum = df_filtered[flow_mask & (df_filtered['Item'] == 'Exp_Month')]['Value_1'].sum()
+    rev_sum = cube_sum(cube, level, ('KPI', 'Rev_Month'), 'Value_1', start_key, end_key)
+    exp_sum = cube_sum(cube, level, ('KPI', 'Exp_Month'), 'Value_1', start_key, end_key)
 
     # 2. Snapshot Data (Deposit/Loan/Budget): Take the LATEST month in selection
-    latest_df = df_filtered.sort_values('SortKey', ascending=False)
-    # Get unique categories for latest month only
-    latest_key = latest_df.iloc[0]['SortKey']
-    df_snapshot = latest_df[latest_df['SortKey'] == latest_key]
+    # (frame is sorted by period, so the latest month is the tail of the slice)
+    latest_key = df_filtered['SortKey'].iloc[-1]
+    df_snapshot = slice_period(df_filtered, latest_key, latest_key)
 
     def get_val(cat, item, col='Value_1'):
-        val = df_snapshot[(df_snapshot['Category'] == cat) & (df_snapshot['Item'] == item)][col].sum()
+        val = cube_sum(cube, level, (cat, item), col, latest_key, latest_key)
         return val
 
     # KPI Snapshot
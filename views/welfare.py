@@ -1,7 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
 from utils.styles import render_header
+from utils.periods import THAI_MONTHS, period_key, slice_period
+from utils.dataset_store import get_cube
+from utils.cube import cube_sum
 
 def show_view():
     render_header("สำนักสวัสดิการ", border_color="#8BC34A")
@@ -10,21 +12,12 @@ def show_view():
         st.error("⚠️ ไม่พบข้อมูล Welfare_Data ใน Excel")
         return
 
-    df = st.session_state['df_welfare'].copy()
+    df = st.session_state['df_welfare']
 
     # --- FILTER LOGIC ---
-    thai_month_map = {
-        "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
-        "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
-    }
-    
-    df['YearNum'] = pd.to_numeric(df['Year'], errors='coerce').fillna(0).astype(int)
-    df['MonthNum'] = df['Month'].map(thai_month_map).fillna(0).astype(int)
-    df['SortKey'] = (df['YearNum'] * 100) + df['MonthNum']
-
     available_years = sorted(df['Year'].unique(), reverse=True)
     if not available_years: available_years = ["2568"]
-    months_list = list(thai_month_map.keys())
+    months_list = THAI_MONTHS
 
     c1, c2, c3, c4, c5 = st.columns([1,1,1,1,1])
     with c1: m_start = st.selectbox("เดือนเริ่มต้น", months_list, index=0)
@@ -39,22 +32,21 @@ def show_view():
 
     # --- KPI DATA (Snapshot Logic) ---
     # For these KPIs (Counts), we take the value from the LATEST month selected.
-    start_key = (int(y_start) * 100) + thai_month_map[m_start]
-    end_key = (int(y_end) * 100) + thai_month_map[m_end]
+    start_key = period_key(y_start, m_start)
+    end_key = period_key(y_end, m_end)
     
-    mask = (df['SortKey'] >= start_key) & (df['SortKey'] <= end_key)
-    df_filtered = df[mask]
+    df_filtered = slice_period(df, start_key, end_key)
     
     if df_filtered.empty:
         st.warning(f"ไม่พบข้อมูลในช่วงเวลา: {m_start} {y_start} - {m_end} {y_end}")
         return
 
     # Get latest snapshot
-    latest_key = df_filtered['SortKey'].max()
-    df_snap = df_filtered[df_filtered['SortKey'] == latest_key]
+    latest_key = df_filtered['SortKey'].iloc[-1]
+    cube = get_cube(df)
 
     def get_val(cat, item, col='Value_1'):
-        val = df_snap[(df_snap['Category'] == cat) & (df_snap['Item'] == item)][col].sum()
+        val = cube_sum(cube, ('Category', 'Item'), (cat, item), col, latest_key, latest_key)
         return int(val)
 
     shop_cnt = get_val('Shop', 'Count')